@@ -0,0 +1,270 @@
+# d:\Smart Ambulance Traffic\Simulation\microsim.py
+
+# ===================================================================
+# HEADLESS TRAFFIC MICROSIMULATOR
+# Simulates vehicles on every approach of one junction and drives a real
+# TrafficSystem through synthetic detections and siren events, on a
+# simulated clock, much faster than real time.
+#
+# Usage:
+#   python -m Simulation.microsim --duration 3600 --policy webster
+#   python -m Simulation.microsim --compare-policies
+#   python -m Simulation.microsim --duration 300 --render   (needs pygame)
+# ===================================================================
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+# --- Add project root to path for imports ---
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from traffic_system import TrafficSystem
+import constants
+
+# --- Vehicle Model (Intelligent Driver Model) ---
+DESIRED_SPEED = 13.9      # m/s (50 km/h)
+AMBULANCE_SPEED = 20.0    # m/s (72 km/h)
+TIME_HEADWAY = 1.5        # s
+MAX_ACCELERATION = 1.0    # m/s^2
+COMFORT_DECELERATION = 2.0 # m/s^2
+MIN_GAP = 2.0             # m, bumper to bumper when stopped
+VEHICLE_LENGTH = 5.0      # m
+
+# --- Road & Sensors ---
+LANE_LENGTH = 300.0       # m, from the spawn point to the stop line
+EXIT_DISTANCE = 20.0      # m past the stop line after which a vehicle has cleared the junction
+CAMERA_RANGE = 80.0       # m before the stop line that each lane's camera can see
+SIREN_RANGE = 200.0       # m within which the junction's microphone hears a siren
+
+# --- Simulation Loop ---
+TIME_STEP = 0.1           # s, also the controller tick interval used by web_app.py
+DETECTION_INTERVAL = 0.5  # s, ~PROCESS_EVERY_NTH_FRAME at 30 FPS
+DEFAULT_ARRIVAL_RATES = {'north': 0.20, 'south': 0.15, 'east': 0.08, 'west': 0.05} # vehicles/s per lane
+
+class MicroSimulation:
+    """
+    A vectorized microsimulation of the approaches of one junction.
+
+    Vehicle state lives in flat numpy arrays (distance to stop line, speed, lane,
+    spawn time, emergency flag), so thousands of vehicles are advanced per step with
+    a handful of array operations. The signals come from the TrafficSystem under test.
+    """
+    def __init__(self, traffic_system, arrival_rates, ambulance_times=(), max_vehicles=10000, seed=0):
+        """
+        Args:
+            traffic_system (TrafficSystem): Controller under test. Its clock must be
+                this simulation's `clock` (see create_simulated_system).
+            arrival_rates (dict): Lane -> mean arrivals per second (Poisson).
+            ambulance_times (iterable): (time_s, lane) pairs at which an ambulance spawns.
+            max_vehicles (int): Capacity of the vehicle arrays.
+            seed (int): Random seed, so policies can be compared on identical traffic.
+        """
+        self.traffic_system = traffic_system
+        self.lanes = list(arrival_rates)
+        self.arrival_rates = np.array([arrival_rates[lane] for lane in self.lanes])
+        self.ambulance_schedule = sorted(ambulance_times)
+        self.rng = np.random.default_rng(seed)
+        self.time_s = 0.0
+        self.next_detection_s = 0.0
+
+        # --- Vehicle State (one slot per vehicle) ---
+        self.position = np.zeros(max_vehicles)              # m to the stop line (negative once past it)
+        self.speed = np.zeros(max_vehicles)
+        self.lane = np.zeros(max_vehicles, dtype=np.int32)
+        self.spawn_time = np.zeros(max_vehicles)
+        self.emergency = np.zeros(max_vehicles, dtype=bool)
+        self.active = np.zeros(max_vehicles, dtype=bool)
+        self.waiting_to_enter = np.zeros(len(self.lanes), dtype=np.int64) # Spill-back beyond the simulated road
+
+        # --- Metrics ---
+        self.completed_delays = []
+        self.ambulance_delays = []
+        self.queue_samples = []
+        self.phase_changes = 0
+        self.last_phase = traffic_system.active_phase
+
+    def clock(self):
+        """Simulated time in seconds; passed to TrafficSystem as its clock."""
+        return self.time_s
+
+    def _spawn(self, lane_index, emergency=False):
+        """Places one vehicle at the start of a lane. Returns False if the entry is blocked or full."""
+        in_lane = self.active & (self.lane == lane_index)
+        if np.any(self.position[in_lane] > LANE_LENGTH - VEHICLE_LENGTH - MIN_GAP):
+            return False
+        free_slots = np.flatnonzero(~self.active)
+        if free_slots.size == 0:
+            return False
+        slot = free_slots[0]
+        self.position[slot] = LANE_LENGTH
+        self.speed[slot] = 0.0 if np.any(in_lane) else DESIRED_SPEED / 2
+        self.lane[slot] = lane_index
+        self.spawn_time[slot] = self.time_s
+        self.emergency[slot] = emergency
+        self.active[slot] = True
+        return True
+
+    def _spawn_arrivals(self):
+        """Adds this step's Poisson arrivals (and scheduled ambulances) to each lane."""
+        self.waiting_to_enter += self.rng.poisson(self.arrival_rates * TIME_STEP)
+        for lane_index in np.flatnonzero(self.waiting_to_enter):
+            if self._spawn(lane_index):
+                self.waiting_to_enter[lane_index] -= 1
+
+        while self.ambulance_schedule and self.ambulance_schedule[0][0] <= self.time_s:
+            _, lane = self.ambulance_schedule[0]
+            if not self._spawn(self.lanes.index(lane), emergency=True):
+                break # Entry blocked; try again next step
+            self.ambulance_schedule.pop(0)
+
+    def _move_vehicles(self):
+        """Advances every active vehicle by one IDM step, stopping at red lights."""
+        indices = np.flatnonzero(self.active)
+        if indices.size == 0:
+            return
+        # Sort by lane, then by distance to the stop line, so each vehicle's leader precedes it.
+        indices = indices[np.lexsort((self.position[indices], self.lane[indices]))]
+        position = self.position[indices]
+        speed = self.speed[indices]
+        lane = self.lane[indices]
+
+        gap = np.full(indices.size, np.inf)
+        leader_speed = np.zeros(indices.size)
+        has_leader = np.r_[False, lane[1:] == lane[:-1]]
+        gap[has_leader] = position[has_leader] - np.roll(position, 1)[has_leader] - VEHICLE_LENGTH
+        leader_speed[has_leader] = np.roll(speed, 1)[has_leader]
+
+        # A red (or a yellow that can still be stopped for) acts as a stopped leader at the stop line.
+        light = np.array([self.traffic_system.light_states[name] for name in self.lanes])[lane]
+        before_line = position > 0
+        can_stop = position > speed ** 2 / (2 * COMFORT_DECELERATION)
+        must_stop = before_line & ((light == 'RED') | ((light == 'YELLOW') & can_stop))
+        stop_gap = np.where(must_stop, position, np.inf)
+        stop_is_closer = stop_gap < gap
+        gap = np.where(stop_is_closer, stop_gap, gap)
+        leader_speed = np.where(stop_is_closer, 0.0, leader_speed)
+
+        desired_speed = np.where(self.emergency[indices], AMBULANCE_SPEED, DESIRED_SPEED)
+        desired_gap = MIN_GAP + speed * TIME_HEADWAY + speed * (speed - leader_speed) / (2 * np.sqrt(MAX_ACCELERATION * COMFORT_DECELERATION))
+        acceleration = MAX_ACCELERATION * (1 - (speed / desired_speed) ** 4 - (np.maximum(desired_gap, 0) / np.maximum(gap, 0.1)) ** 2)
+
+        new_speed = np.maximum(speed + acceleration * TIME_STEP, 0.0)
+        new_position = position - new_speed * TIME_STEP
+        # Never creep over a stop line that must be respected.
+        overshoot = must_stop & (new_position < 0)
+        new_position[overshoot] = 0.0
+        new_speed[overshoot] = 0.0
+
+        self.position[indices] = new_position
+        self.speed[indices] = new_speed
+
+        # Vehicles that have cleared the junction leave the simulation.
+        done = indices[new_position < -EXIT_DISTANCE]
+        if done.size:
+            free_flow = (LANE_LENGTH + EXIT_DISTANCE) / np.where(self.emergency[done], AMBULANCE_SPEED, DESIRED_SPEED)
+            delay = self.time_s - self.spawn_time[done] - free_flow
+            self.completed_delays.extend(delay[~self.emergency[done]].tolist())
+            self.ambulance_delays.extend(delay[self.emergency[done]].tolist())
+            self.active[done] = False
+
+    def _report_detections(self):
+        """Feeds the controller what its cameras and microphone would see right now."""
+        visible = self.active & (self.position >= 0) & (self.position < CAMERA_RANGE)
+        counts = np.bincount(self.lane[visible], minlength=len(self.lanes))
+        ambulances = np.bincount(self.lane[visible & self.emergency], minlength=len(self.lanes))
+        for lane_index, lane in enumerate(self.lanes):
+            self.traffic_system.update_detection_results(lane, int(counts[lane_index]), bool(ambulances[lane_index]))
+
+        siren_audible = self.active & self.emergency & (np.abs(self.position) < SIREN_RANGE)
+        if np.any(siren_audible):
+            self.traffic_system.report_siren()
+
+        queued = self.active & (self.position > 0) & (self.speed < 0.5)
+        self.queue_samples.append(int(np.count_nonzero(queued)) + int(self.waiting_to_enter.sum()))
+
+    def step(self):
+        """Advances the simulation (and the controller) by one time step."""
+        self.time_s += TIME_STEP
+        self._spawn_arrivals()
+        if self.time_s >= self.next_detection_s:
+            self._report_detections()
+            self.next_detection_s += DETECTION_INTERVAL
+        self.traffic_system.tick()
+        if self.traffic_system.active_phase != self.last_phase:
+            self.phase_changes += 1
+            self.last_phase = self.traffic_system.active_phase
+        self._move_vehicles()
+
+    def run(self, duration_s, renderer=None, render_every=5):
+        """Runs for `duration_s` simulated seconds and returns the metrics."""
+        steps = int(round(duration_s / TIME_STEP))
+        for step_index in range(steps):
+            self.step()
+            if renderer is not None and step_index % render_every == 0:
+                if not renderer.draw(self):
+                    break # Window closed
+        return self.metrics()
+
+    def metrics(self):
+        """Summary statistics of the run so far."""
+        delays = np.array(self.completed_delays)
+        return {
+            'simulated_s': round(self.time_s, 3),
+            'vehicles_completed': int(delays.size),
+            'average_delay_s': float(delays.mean()) if delays.size else None,
+            'p95_delay_s': float(np.percentile(delays, 95)) if delays.size else None,
+            'average_queue': float(np.mean(self.queue_samples)) if self.queue_samples else 0.0,
+            'max_queue': max(self.queue_samples, default=0),
+            'ambulance_delays_s': [round(delay, 2) for delay in self.ambulance_delays],
+            'phase_changes': self.phase_changes,
+            'vehicles_in_network': int(np.count_nonzero(self.active) + self.waiting_to_enter.sum()),
+        }
+
+def create_simulated_system(arrival_rates=None, policy=constants.GREEN_TIME_POLICY, phase_plan=None, **kwargs):
+    """Builds a MicroSimulation wired to a fresh TrafficSystem running on simulated time."""
+    arrival_rates = arrival_rates or DEFAULT_ARRIVAL_RATES
+    simulation = None
+    traffic_system = TrafficSystem(lanes=list(arrival_rates), phase_plan=phase_plan, green_time_policy=policy,
+                                   clock=lambda: simulation.time_s if simulation else 0.0,
+                                   alert_sender=lambda message: None)
+    simulation = MicroSimulation(traffic_system, arrival_rates, **kwargs)
+    return simulation
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless traffic microsimulation driving TrafficSystem.")
+    parser.add_argument('--duration', type=float, default=3600, help="Simulated seconds.")
+    parser.add_argument('--policy', default=constants.GREEN_TIME_POLICY, choices=['webster', 'fixed'])
+    parser.add_argument('--compare-policies', action='store_true', help="Run every policy on identical traffic.")
+    parser.add_argument('--arrival-scale', type=float, default=1.0, help="Multiply the default arrival rates.")
+    parser.add_argument('--ambulance-every', type=float, default=0, help="Spawn an ambulance every N seconds (0 = never).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--render', action='store_true', help="Draw the junction with pygame while simulating.")
+    args = parser.parse_args()
+
+    arrival_rates = {lane: rate * args.arrival_scale for lane, rate in DEFAULT_ARRIVAL_RATES.items()}
+    ambulance_times = []
+    if args.ambulance_every > 0:
+        lanes = list(arrival_rates)
+        times = np.arange(args.ambulance_every, args.duration, args.ambulance_every)
+        ambulance_times = [(float(t), lanes[i % len(lanes)]) for i, t in enumerate(times)]
+
+    policies = ['webster', 'fixed'] if args.compare_policies else [args.policy]
+    renderer = None
+    if args.render:
+        from Simulation.traffic_gui import JunctionView # pygame is only needed when rendering
+        renderer = JunctionView(list(arrival_rates))
+
+    results = {}
+    for policy in policies:
+        simulation = create_simulated_system(arrival_rates, policy=policy, ambulance_times=ambulance_times, seed=args.seed)
+        results[policy] = simulation.run(args.duration, renderer=renderer)
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -55,3 +55,52 @@ class TrafficLight:
         pygame.draw.circle(surface, red_color, (self.x, self.y - self.radius * 2.2), self.radius)
         pygame.draw.circle(surface, yellow_color, (self.x, self.y), self.radius)
         pygame.draw.circle(surface, green_color, (self.x, self.y + self.radius * 2.2), self.radius)
+
+
+class JunctionView:
+    """
+    Optional pygame renderer for Simulation.microsim: one approach road per lane,
+    vehicles as dots and a TrafficLight per lane showing the controller's state.
+    """
+    def __init__(self, lanes, size=800):
+        import math
+        pygame.init()
+        self.surface = pygame.display.set_mode((size, size))
+        pygame.display.set_caption("Traffic Microsimulation")
+        self.clock = pygame.time.Clock()
+        self.size = size
+        self.lanes = lanes
+        center = size // 2
+        # Approaches are spread evenly around the junction, pointing at the center.
+        self.directions = {lane: (math.sin(2 * math.pi * i / len(lanes)), -math.cos(2 * math.pi * i / len(lanes)))
+                           for i, lane in enumerate(lanes)}
+        self.lights = {lane: TrafficLight(int(center + dx * 90), int(center + dy * 90), radius=8)
+                       for lane, (dx, dy) in self.directions.items()}
+
+    def draw(self, simulation):
+        """Draws one frame. Returns False once the window has been closed."""
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return False
+
+        from Simulation.microsim import LANE_LENGTH
+        center = self.size // 2
+        scale = (self.size / 2 - 20) / LANE_LENGTH
+        self.surface.fill(BLACK)
+
+        for lane, (dx, dy) in self.directions.items():
+            end = (center + dx * LANE_LENGTH * scale, center + dy * LANE_LENGTH * scale)
+            pygame.draw.line(self.surface, HOUSING_COLOR, (center, center), end, 14)
+            self.lights[lane].set_light(simulation.traffic_system.light_states[lane].lower())
+            self.lights[lane].draw(self.surface)
+
+        for slot in simulation.active.nonzero()[0]:
+            dx, dy = self.directions[simulation.lanes[simulation.lane[slot]]]
+            distance = max(simulation.position[slot], 0) * scale + 20
+            color = RED if simulation.emergency[slot] else WHITE
+            pygame.draw.circle(self.surface, color, (int(center + dx * distance), int(center + dy * distance)), 3)
+
+        pygame.display.flip()
+        self.clock.tick(60)
+        return True
@@ -1,42 +1,94 @@
 # d:\Smart Ambulance Traffic\core\audio.py
 
 import collections
-import sounddevice as sd
-from scipy.fft import fft
 import numpy as np
 import constants
+from runtime_config import RuntimeConfig
 
-def audio_listener_thread(siren_detected_callback, stop_event=None):
+# sounddevice and scipy are imported inside the functions that use them, so importing
+# this module (e.g. from web_app.py) doesn't pay for them before audio is started.
+
+SAMPLE_RATE = 44100
+CHUNK_SIZE = 2048 # Analyze audio in larger chunks to reduce callback frequency
+
+def create_siren_callback(siren_detected_callback, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE, config=None,
+                          level_callback=None, evidence_is_weak=None):
     """
-    Listens for siren sounds in a background thread and triggers a callback.
+    Builds the per-chunk audio callback used by the siren detector.
+
+    Kept separate from the input stream so it can be fed synthetic audio
+    (e.g. by benchmark.py) without a microphone.
 
     Args:
         siren_detected_callback: A function to call when a siren is confirmed.
-        stop_event (threading.Event, optional): Event to signal the thread to stop.
+        sample_rate (int): Sample rate of the incoming audio.
+        chunk_size (int): Number of samples per callback block.
+        config (RuntimeConfig, optional): Live-tunable SIREN_* settings, re-read on every
+            block. Defaults to the values in constants.py.
+        level_callback (callable, optional): Called with each analysed block's siren level
+            in [0, 1]: the share of spectral energy in the siren band, scaled down when the
+            band peak is quieter than SIREN_LOUDNESS_THRESHOLD.
+        evidence_is_weak (callable, optional): Returns True while there is no emergency
+            evidence; only every AUDIO_IDLE_BLOCK_STRIDE-th block is analysed then.
     """
-    SAMPLE_RATE = 44100
-    CHUNK_SIZE = 2048 # Analyze audio in larger chunks to reduce callback frequency
-    detection_history = collections.deque(maxlen=constants.SIREN_DETECTION_WINDOW)
+    from scipy.fft import fft
+    config = config or RuntimeConfig()
+    detection_history = collections.deque(maxlen=config.current()['SIREN_DETECTION_WINDOW'])
+    xf = np.fft.fftfreq(chunk_size, 1 / sample_rate) # Frequency bins never change, compute once
+    block_count = 0
 
     def audio_callback(indata, frames, time, status):
+        nonlocal detection_history, block_count
         if status: print(status, flush=True)
+        block_count += 1
+        if evidence_is_weak is not None and block_count % constants.AUDIO_IDLE_BLOCK_STRIDE and evidence_is_weak():
+            return # Nothing going on: analyse fewer blocks
+        settings = config.current()
+        if detection_history.maxlen != settings['SIREN_DETECTION_WINDOW']:
+            detection_history = collections.deque(detection_history, maxlen=settings['SIREN_DETECTION_WINDOW'])
         yf = fft(indata[:, 0])
-        xf = np.fft.fftfreq(CHUNK_SIZE, 1 / SAMPLE_RATE)
         peak_index = np.argmax(np.abs(yf))
         peak_frequency = abs(xf[peak_index])
         peak_magnitude = np.abs(yf[peak_index])
 
         is_siren_like = (
-            constants.SIREN_FREQUENCY_RANGE[0] < peak_frequency < constants.SIREN_FREQUENCY_RANGE[1] and
-            peak_magnitude > constants.SIREN_LOUDNESS_THRESHOLD
+            settings['SIREN_FREQUENCY_RANGE'][0] < peak_frequency < settings['SIREN_FREQUENCY_RANGE'][1] and
+            peak_magnitude > settings['SIREN_LOUDNESS_THRESHOLD']
         )
         detection_history.append(is_siren_like)
 
-        if sum(detection_history) >= constants.SIREN_CONFIRMATION_COUNT:
+        if level_callback is not None:
+            low, high = settings['SIREN_FREQUENCY_RANGE']
+            energy = np.abs(yf) ** 2
+            in_band = (np.abs(xf) > low) & (np.abs(xf) < high)
+            total_energy = energy.sum()
+            if total_energy > 0:
+                band_share = energy[in_band].sum() / total_energy
+                band_peak = np.sqrt(energy[in_band].max()) if in_band.any() else 0.0
+                level_callback(float(band_share * min(1.0, band_peak / settings['SIREN_LOUDNESS_THRESHOLD'])))
+
+        if sum(detection_history) >= settings['SIREN_CONFIRMATION_COUNT']:
             siren_detected_callback()
             detection_history.clear()
 
+    return audio_callback
+
+def audio_listener_thread(siren_detected_callback, stop_event=None, config=None, level_callback=None,
+                          evidence_is_weak=None):
+    """
+    Listens for siren sounds in a background thread and triggers a callback.
+
+    Args:
+        siren_detected_callback: A function to call when a siren is confirmed.
+        stop_event (threading.Event, optional): Event to signal the thread to stop.
+        config (RuntimeConfig, optional): Live-tunable siren settings.
+        level_callback, evidence_is_weak (callable, optional): See create_siren_callback.
+    """
+    import sounddevice as sd
+    audio_callback = create_siren_callback(siren_detected_callback, config=config, level_callback=level_callback,
+                                           evidence_is_weak=evidence_is_weak)
+
     print("🎤 Starting audio listener...")
     with sd.InputStream(callback=audio_callback, channels=1, samplerate=SAMPLE_RATE, blocksize=CHUNK_SIZE):
         while not (stop_event and stop_event.is_set()):
-            sd.sleep(1000)
\ No newline at end of file
+            sd.sleep(1000)
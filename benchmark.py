@@ -0,0 +1,314 @@
+# d:\Smart Ambulance Traffic\benchmark.py
+
+# ===================================================================
+# HEADLESS BENCHMARK SUITE
+# Measures the hot paths of the system without opening any windows:
+#   - vision:  VisionProcessor detection throughput (resolutions x batch sizes)
+#   - audio:   siren detector callbacks per second on synthetic tones
+#   - control: TrafficSystem.tick rate
+#   - stream:  MJPEG encode / fan-out cost per connected client
+#   - startup: web_app import time and detector load + warm-up time
+#
+# Usage:
+#   python benchmark.py --output results.json
+#   python benchmark.py --only audio control --compare results.json
+# ===================================================================
+
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+# --- Add project root to path for imports ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+import constants
+
+SECTIONS = ['vision', 'audio', 'control', 'stream', 'startup']
+VISION_RESOLUTIONS = [320, 480, 640]
+VISION_BATCH_SIZES = [1, 2, 4]
+STREAM_CLIENT_COUNTS = [1, 2, 4, 8]
+REGRESSION_TOLERANCE = 0.15 # A metric 15% worse than the baseline counts as a regression
+
+def _rate(count, elapsed):
+    """Returns operations per second, guarding against a zero-length timer."""
+    return count / elapsed if elapsed > 0 else float('inf')
+
+def _benchmark_clips():
+    """Returns the bundled traffic clips used as benchmark input."""
+    return sorted(glob.glob(os.path.join(current_dir, 'traffic_*.mp4')))
+
+def _read_sample_frame(width=constants.RESIZE_WIDTH):
+    """Grabs one frame from a bundled clip (or a noise frame if none can be read)."""
+    import cv2
+    for clip in _benchmark_clips():
+        cap = cv2.VideoCapture(clip)
+        success, frame = cap.read()
+        cap.release()
+        if success:
+            height = int(width * frame.shape[0] / frame.shape[1])
+            return cv2.resize(frame, (width, height))
+    return np.random.randint(0, 255, (int(width * 0.5625), width, 3), dtype=np.uint8)
+
+# ===================================================================
+# INDIVIDUAL BENCHMARKS
+# ===================================================================
+def bench_vision(duration):
+    """Detection throughput for every clip, resolution and batch size."""
+    from detection_engine import DetectionEngine
+    from vision import VisionProcessor
+
+    if not os.path.exists(constants.YOLO_MODEL_PATH):
+        return {'skipped': f"model file '{constants.YOLO_MODEL_PATH}' not found"}
+    clips = _benchmark_clips()
+    if not clips:
+        return {'skipped': 'no traffic_*.mp4 clips found'}
+
+    engine = DetectionEngine()
+    results = {}
+    try:
+        for clip in clips:
+            clip_name = os.path.basename(clip)
+            for width in VISION_RESOLUTIONS:
+                try:
+                    processor = VisionProcessor(video_source=clip, lane_name=clip_name, resize_width=width,
+                                                detection_engine=engine)
+                except IOError as e: # The clip can't be opened; the other clips still run
+                    results[f"{clip_name}@{width}"] = {'skipped': str(e)}
+                    continue
+                try:
+                    processor.detect([processor.read()[1]]) # Warm-up, excluded from timing
+                    for batch_size in VISION_BATCH_SIZES:
+                        frames_done = 0
+                        start = time.perf_counter()
+                        while time.perf_counter() - start < duration:
+                            batch = [processor.read()[1] for _ in range(batch_size)]
+                            processor.detect(batch)
+                            frames_done += batch_size
+                        elapsed = time.perf_counter() - start
+                        results[f"{clip_name}@{width}/batch{batch_size}"] = {
+                            'frames_per_sec': _rate(frames_done, elapsed),
+                            'ms_per_frame': 1000 * elapsed / frames_done,
+                        }
+                finally:
+                    processor.stop()
+    finally:
+        engine.stop()
+    return results
+
+def bench_audio(duration):
+    """Siren detector callbacks per second on siren-band and background tones."""
+    from audio import create_siren_callback, SAMPLE_RATE, CHUNK_SIZE
+
+    t = np.arange(CHUNK_SIZE) / SAMPLE_RATE
+    tones = {
+        'siren_tone': np.sin(2 * np.pi * 1000 * t),
+        'background_tone': 0.1 * np.sin(2 * np.pi * 200 * t),
+    }
+
+    results = {}
+    for name, tone in tones.items():
+        confirmations = []
+        callback = create_siren_callback(lambda: confirmations.append(1))
+        indata = tone.reshape(-1, 1).astype(np.float32)
+        calls = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            callback(indata, CHUNK_SIZE, None, None)
+            calls += 1
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            'callbacks_per_sec': _rate(calls, elapsed),
+            'realtime_factor': _rate(calls, elapsed) * CHUNK_SIZE / SAMPLE_RATE,
+            'sirens_confirmed': len(confirmations),
+        }
+    return results
+
+def bench_control(duration):
+    """TrafficSystem.tick rate while detections change every few ticks."""
+    from traffic_system import TrafficSystem
+
+    system = TrafficSystem(alert_sender=lambda message: None) # Never hit Telegram from a benchmark
+    rng = random.Random(0) # Deterministic detection pattern for comparable runs
+    ticks = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        if ticks % 10 == 0:
+            for lane in constants.LANES:
+                system.update_detection_results(lane, rng.randint(0, 20), rng.random() < 0.02)
+        system.tick()
+        ticks += 1
+    elapsed = time.perf_counter() - start
+    return {'tick': {'ticks_per_sec': _rate(ticks, elapsed), 'us_per_tick': 1e6 * elapsed / ticks}}
+
+def bench_stream(duration):
+    """MJPEG encode cost per stream variant, how it scales with connected clients, and the grid stream."""
+    from streams import StreamHub
+    frame = _read_sample_frame()
+    hub = StreamHub()
+    # Stand-in for an Intersection: StreamHub only needs these attributes.
+    intersection = types.SimpleNamespace(name='bench', lanes=list(constants.LANES), last_frames={}, lock=threading.Lock())
+
+    results = {}
+    for variant in constants.STREAM_VARIANTS:
+        for clients in STREAM_CLIENT_COUNTS:
+            rounds = 0
+            payload_bytes = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                # A new camera frame arrives, then every client asks for it (only the first one encodes).
+                intersection.last_frames['north'] = frame.copy()
+                for _ in range(clients):
+                    payload_bytes += len(hub.lane_jpeg(intersection, 'north', variant))
+                rounds += 1
+            elapsed = time.perf_counter() - start
+            results[f"{variant}_clients{clients}"] = {
+                'frame_rounds_per_sec': _rate(rounds, elapsed),
+                'ms_per_client_frame': 1000 * elapsed / (rounds * clients),
+                'bytes_per_frame': payload_bytes / (rounds * clients),
+            }
+
+    # The composited grid of all lanes, rebuilt every round (the hub's rate limit is bypassed).
+    hub.frame_interval_s = 0
+    rounds = 0
+    payload_bytes = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        for lane in intersection.lanes:
+            intersection.last_frames[lane] = frame.copy()
+        payload_bytes += len(hub.grid_jpeg(intersection))
+        rounds += 1
+    elapsed = time.perf_counter() - start
+    results['grid'] = {'frames_per_sec': _rate(rounds, elapsed), 'ms_per_frame': 1000 * elapsed / rounds,
+                       'bytes_per_frame': payload_bytes / rounds}
+    return results
+
+def bench_startup(duration):
+    """Cold import time of web_app.py (in a fresh interpreter) and detector load + warm-up time."""
+    from detection_engine import DetectionEngine
+
+    import_script = ("import time; start = time.perf_counter(); import web_app; "
+                     "print(time.perf_counter() - start)")
+    try:
+        output = subprocess.check_output([sys.executable, '-c', import_script], cwd=current_dir, text=True,
+                                         stderr=subprocess.PIPE)
+        results = {'web_app_import': {'import_s': float(output.strip().splitlines()[-1])}}
+    except subprocess.CalledProcessError as e:
+        # e.g. a missing dependency in the child; keep going so the report is still written.
+        error_lines = (e.stderr or '').strip().splitlines()
+        results = {'web_app_import': {'skipped': f"import web_app failed: {error_lines[-1] if error_lines else e}"}}
+
+    if not os.path.exists(constants.YOLO_MODEL_PATH):
+        results['detector'] = {'skipped': f"model file '{constants.YOLO_MODEL_PATH}' not found"}
+        return results
+    start = time.perf_counter()
+    engine = DetectionEngine(warmup_shape=(constants.RESIZE_WIDTH * 9 // 16, constants.RESIZE_WIDTH))
+    engine.wait_until_ready()
+    results['detector'] = {'ready_s': time.perf_counter() - start, **{f"{step}_s": t for step, t in engine.timings.items()}}
+    engine.stop()
+    return results
+
+BENCHMARKS = {
+    'vision': bench_vision,
+    'audio': bench_audio,
+    'control': bench_control,
+    'stream': bench_stream,
+    'startup': bench_startup,
+}
+
+# ===================================================================
+# REPORTING & COMPARISON
+# ===================================================================
+def _git_commit():
+    """Returns the current commit hash, or None outside of a git checkout."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=current_dir,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sections, duration):
+    """Runs the selected benchmark sections and returns a JSON-serialisable report."""
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'duration_per_case_s': duration,
+        },
+        'results': {},
+    }
+    for section in sections:
+        print(f"⏱️ Running {section} benchmark...", file=sys.stderr)
+        try:
+            report['results'][section] = BENCHMARKS[section](duration)
+        except (ImportError, OSError) as e: # OSError: e.g. sounddevice without a PortAudio library
+            report['results'][section] = {'skipped': f"missing dependency: {e}"}
+    return report
+
+# Metrics where a larger number is better; every other metric is a cost.
+HIGHER_IS_BETTER = {'frames_per_sec', 'callbacks_per_sec', 'realtime_factor', 'ticks_per_sec', 'frame_rounds_per_sec'}
+COMPARED_METRICS = HIGHER_IS_BETTER | {'ms_per_frame', 'us_per_tick', 'ms_per_client_frame', 'import_s', 'ready_s'}
+
+def compare_reports(baseline, current, tolerance=REGRESSION_TOLERANCE):
+    """Returns a list of human-readable regressions of `current` against `baseline`."""
+    regressions = []
+    for section, cases in current['results'].items():
+        for case, metrics in cases.items():
+            if not isinstance(metrics, dict):
+                continue
+            base_metrics = baseline.get('results', {}).get(section, {}).get(case)
+            if not isinstance(base_metrics, dict):
+                continue
+            for metric, value in metrics.items():
+                base_value = base_metrics.get(metric)
+                if metric not in COMPARED_METRICS or not base_value:
+                    continue
+                change = (value - base_value) / base_value
+                if metric in HIGHER_IS_BETTER:
+                    change = -change
+                if change > tolerance:
+                    regressions.append(f"{section}/{case}/{metric}: {base_value:.3f} -> {value:.3f} ({change:+.0%} worse)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the traffic system hot paths.")
+    parser.add_argument('--only', nargs='+', choices=SECTIONS, default=SECTIONS, help="Sections to run.")
+    parser.add_argument('--duration', type=float, default=2.0, help="Seconds spent on each benchmark case.")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+    parser.add_argument('--compare', help="Baseline JSON report; exit with status 1 on regressions.")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.only, args.duration)
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+        print(f"✅ Benchmark report written to '{args.output}'", file=sys.stderr)
+    else:
+        print(report_json)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report)
+        for line in regressions:
+            print(f"❌ REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline.", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# d:\Smart Ambulance Traffic\core\check_corridor.py
+#
+# Headless check of green-wave corridor pre-emption over the LoopbackBus: no cameras,
+# models or network needed. Run with `python check_corridor.py`; exits 1 on failure.
+
+import sys
+from corridor import CorridorCoordinator, LoopbackBus
+from traffic_system import TrafficSystem
+import constants
+
+LANES = ['north', 'south', 'east', 'west']
+
+class RecordingBus(LoopbackBus):
+    """LoopbackBus that also keeps every (topic, message) it delivered."""
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, topic, message):
+        self.published.append((topic, message))
+        super().publish(topic, message)
+
+def build_corridor(names, links):
+    """One TrafficSystem + CorridorCoordinator per name, all on a fixed clock at t=0."""
+    bus = RecordingBus()
+    systems, coordinators = {}, {}
+    for name in names:
+        systems[name] = TrafficSystem(lanes=LANES, clock=lambda: 0.0, alert_sender=lambda message: None)
+        coordinators[name] = CorridorCoordinator(name, systems[name], bus, links)
+    return bus, systems, coordinators
+
+def link(source, target, travel_time_s):
+    return {'from': source, 'from_lane': 'west', 'to': target, 'to_lane': 'west', 'travel_time_s': travel_time_s}
+
+def spot_ambulance(systems, coordinators, name):
+    systems[name].update_detection_results('west', 3, 1.0)
+    coordinators[name].tick()
+
+def check_propagation():
+    """A -> B -> C: each downstream junction gets the arrival time summed along the route."""
+    bus, systems, coordinators = build_corridor(['A', 'B', 'C'], [link('A', 'B', 25), link('B', 'C', 30)])
+    spot_ambulance(systems, coordinators, 'A')
+
+    expected_arrival_ms = {'B': 25000, 'C': 55000}
+    for name, arrival_ms in expected_arrival_ms.items():
+        window = systems[name].preemption_windows.get('west')
+        assert window is not None, f"{name} got no pre-emption window"
+        assert window[1] == arrival_ms + constants.CORRIDOR_PREEMPTION_HOLD_MS, f"{name} window ends at {window[1]}"
+    assert [message['route'] for _, message in bus.published] == [['A', 'B'], ['A', 'B', 'C']]
+
+    # Seeing the same ambulance again must not re-announce it.
+    coordinators['A'].tick()
+    assert len(bus.published) == 2, "ambulance re-announced while still in view"
+
+def check_hop_limit():
+    """A long chain stops forwarding after CORRIDOR_MAX_HOPS junctions."""
+    names = [f"J{i}" for i in range(constants.CORRIDOR_MAX_HOPS + 3)]
+    links = [link(a, b, 10) for a, b in zip(names, names[1:])]
+    bus, systems, coordinators = build_corridor(names, links)
+    spot_ambulance(systems, coordinators, names[0])
+
+    reached = [name for name in names[1:] if 'west' in systems[name].preemption_windows]
+    assert len(reached) == constants.CORRIDOR_MAX_HOPS, f"announcement reached {len(reached)} junctions"
+    assert max(len(message['route']) for _, message in bus.published) == constants.CORRIDOR_MAX_HOPS + 1
+
+def check_loop_avoidance():
+    """A <-> B links never bounce an announcement back into a junction already on the route."""
+    bus, systems, coordinators = build_corridor(['A', 'B'], [link('A', 'B', 20), link('B', 'A', 20)])
+    spot_ambulance(systems, coordinators, 'A')
+
+    assert [topic for topic, _ in bus.published] == ['corridor/B'], f"published {bus.published}"
+    assert 'west' not in systems['A'].preemption_windows, "A pre-empted by its own announcement"
+
+CHECKS = [check_propagation, check_hop_limit, check_loop_avoidance]
+
+if __name__ == '__main__':
+    failures = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"✅ {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {check.__name__}: {e}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,138 @@
+# d:\Smart Ambulance Traffic\core\clip_recorder.py
+
+import collections
+import json
+import os
+import re
+import threading
+import time
+import constants
+
+class ClipRecorder:
+    """
+    Keeps the last few seconds of every camera as already-encoded JPEG frames and
+    exports an incident clip around each ambulance or siren pre-emption.
+
+    The video threads hand over JPEG bytes (never raw frames), at most
+    constants.CLIP_RING_FPS per lane, and frames older than the longest clip are
+    dropped, so memory stays bounded at a few MB per lane. trigger() only
+    records the request; a background worker waits until the post-event footage
+    has arrived and then writes the clip, so detection is never stalled.
+
+    Each clip is a folder holding one <lane>.mjpeg per camera (the JPEG frames
+    concatenated as-is, playable with e.g. `ffplay -f mjpeg`) and a clip.json with
+    the trigger reasons and every frame's timestamp.
+    """
+    def __init__(self, directory=constants.CLIP_DIR, pre_event_s=constants.CLIP_PRE_EVENT_S,
+                 post_event_s=constants.CLIP_POST_EVENT_S, max_length_s=constants.CLIP_MAX_LENGTH_S,
+                 ring_fps=constants.CLIP_RING_FPS):
+        """
+        Args:
+            directory (str): Folder the clips are written to.
+            pre_event_s (float): Seconds of footage kept before the event.
+            post_event_s (float): Seconds of footage recorded after the event.
+            max_length_s (float): Longest clip that merged events may grow to.
+            ring_fps (float): Most frames per second kept per lane.
+        """
+        self.directory = directory
+        self.pre_event_s = pre_event_s
+        self.post_event_s = post_event_s
+        self.frame_interval_s = 1 / ring_fps
+        self.max_length_s = max(max_length_s, pre_event_s + post_event_s)
+        self.retention_s = self.max_length_s + 2 # Slack for the worker's wake-up delay
+
+        self.rings = {} # intersection -> lane -> deque of (timestamp_s, jpeg bytes)
+        self.pending = [] # Clips waiting for their post-event footage
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def wants_frame(self, intersection, lane, timestamp_s):
+        """True if a frame taken at `timestamp_s` should be encoded and added (rate limit)."""
+        with self.condition:
+            ring = self.rings.get(intersection, {}).get(lane)
+            return not ring or timestamp_s - ring[-1][0] >= self.frame_interval_s
+
+    def add_frame(self, intersection, lane, timestamp_s, jpeg):
+        """Adds one encoded frame to a lane's ring and drops frames past the retention window."""
+        with self.condition:
+            ring = self.rings.setdefault(intersection, {}).setdefault(lane, collections.deque())
+            ring.append((timestamp_s, bytes(jpeg)))
+            while ring and timestamp_s - ring[0][0] > self.retention_s:
+                ring.popleft()
+
+    def trigger(self, intersection, reason, ts_ms=None):
+        """
+        Requests a clip from pre_event_s before to post_event_s after the event.
+        Events close together at the same intersection are merged into one clip.
+        Cheap and non-blocking; safe to call from TrafficSystem.tick().
+        """
+        event_s = time.time() if ts_ms is None else ts_ms / 1000
+        with self.condition:
+            for clip in self.pending:
+                end_s = max(clip['end_s'], event_s + self.post_event_s)
+                if (clip['intersection'] == intersection and event_s - self.pre_event_s <= clip['end_s']
+                        and end_s - clip['start_s'] <= self.max_length_s):
+                    clip['end_s'] = end_s
+                    clip['reasons'].append(reason)
+                    return
+            self.pending.append({'intersection': intersection, 'event_s': event_s, 'reasons': [reason],
+                                 'start_s': event_s - self.pre_event_s, 'end_s': event_s + self.post_event_s})
+            self.condition.notify()
+
+    def _worker(self):
+        """Background thread: exports each clip once its post-event footage is in the ring."""
+        while True:
+            with self.condition:
+                due = [clip for clip in self.pending if not self.running or time.time() >= clip['end_s']]
+                if not due:
+                    if not self.running:
+                        return
+                    next_due = min((clip['end_s'] for clip in self.pending), default=None)
+                    self.condition.wait(timeout=None if next_due is None else max(0.05, next_due - time.time()))
+                    continue
+                for clip in due:
+                    self.pending.remove(clip)
+                # Copy the frames out under the lock; the slow file writes happen without it.
+                frames = {
+                    id(clip): {lane: [frame for frame in ring if clip['start_s'] <= frame[0] <= clip['end_s']]
+                               for lane, ring in self.rings.get(clip['intersection'], {}).items()}
+                    for clip in due
+                }
+            for clip in due:
+                try:
+                    self._export(clip, frames[id(clip)])
+                except OSError as e:
+                    print(f"⚠️ Could not write incident clip for {clip['intersection']}: {e}")
+
+    def _export(self, clip, frames_by_lane):
+        """Writes one clip folder atomically (into a temp folder, then renamed)."""
+        if not any(frames_by_lane.values()):
+            return
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(clip['event_s'])) + f"{clip['event_s'] % 1:.3f}"[1:]
+        reason = re.sub(r'[^A-Za-z0-9]+', '_', clip['reasons'][0]).strip('_')[:40]
+        clip_name = f"{clip['intersection']}-{stamp}-{reason}"
+        final_path = os.path.join(self.directory, clip_name)
+        temp_path = final_path + '.tmp'
+        os.makedirs(temp_path, exist_ok=True)
+
+        manifest = {'intersection': clip['intersection'], 'event_time': clip['event_s'], 'reasons': clip['reasons'],
+                    'start_time': clip['start_s'], 'end_time': clip['end_s'], 'lanes': {}}
+        for lane, frames in frames_by_lane.items():
+            with open(os.path.join(temp_path, f"{lane}.mjpeg"), 'wb') as f:
+                for _, jpeg in frames:
+                    f.write(jpeg)
+            manifest['lanes'][lane] = [timestamp for timestamp, _ in frames]
+        with open(os.path.join(temp_path, 'clip.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.replace(temp_path, final_path) # Viewers never see a half-written clip
+        print(f"🎬 Incident clip saved: {final_path}")
+
+    def stop(self):
+        """Exports the clips still waiting (with the footage so far) and stops the worker."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
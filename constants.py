@@ -20,13 +20,30 @@ SIREN_CONFIRMATION_COUNT = 4
 # --- Traffic & Vehicle Detection ---
 HIGH_DENSITY_THRESHOLD = 10
 VEHICLE_CLASSES = ['car', 'motorcycle', 'bus', 'truck']
-EMERGENCY_VEHICLE_CLASSES = ['ambulance', 'fire truck', 'police car', 'bus', 'truck']
+EMERGENCY_VEHICLE_CLASSES = ['ambulance', 'fire truck', 'police car']
+# The stock yolov8n.pt has no ambulance class, so buses and trucks are emergency *candidates*.
+# Their crops go through a second-stage classifier before they count as an ambulance.
+EMERGENCY_CANDIDATE_CLASSES = ['bus', 'truck']
+
+# --- Second-Stage Emergency Vehicle Classifier ---
+EMERGENCY_CLASSIFIER_ENABLED = True   # If False, every candidate counts as an emergency vehicle (old behaviour)
+EMERGENCY_CLASSIFIER_MODEL_PATH = "emergency_classifier.onnx" # Optional; a colour heuristic is used if missing
+EMERGENCY_CLASSIFIER_INPUT_SIZE = 64  # Crops are resized to this square size
+EMERGENCY_SCORE_THRESHOLD = 0.6       # Classifier score needed to accept a candidate
+EMERGENCY_FLASH_SCORE_THRESHOLD = 0.35 # Lower bar when a flashing light bar is seen on the candidate
+LIGHT_BAR_HISTORY = 12                # Light-bar samples kept per tracked candidate
+LIGHT_BAR_MIN_SWING = 0.05            # Minimum on/off brightness swing that counts as flashing
 
 # --- Traffic Light Timings (in milliseconds) ---
 GREEN_LIGHT_DURATION_DENSITY = 10000
 YELLOW_LIGHT_DURATION = 3000
 GREEN_LIGHT_GRACE_PERIOD = 4000 # Time to wait with low density before switching from green to yellow
-RIGHT_TURN_YELLOW_DELAY = 1500  # How long after density drops that the right turn signal goes yellow. Must be < GREEN_LIGHT_GRACE_PERIOD
+PHASE_MIN_GREEN_MS = 5000       # Default minimum green of a phase (overridable per phase in the phase plan)
+PHASE_MAX_GREEN_MS = 60000      # Default maximum green; room for a saturated phase's share of a Webster cycle (up to WEBSTER_CYCLE_MAX_MS)
+
+# --- Phase Selection ---
+# A pending pedestrian call counts like this many queued vehicles when phases compete for green.
+PEDESTRIAN_CALL_DEMAND = 3
 
 # --- Road Layout Configuration ---
 LANES = ['north', 'south', 'east', 'west'] # Defines the lanes for a 4-way intersection.
@@ -41,4 +58,87 @@ VIDEO_SOURCES = {
     'south': 'traffic_south.mp4',
     'east': 'traffic_east.mp4',
     'west': 'traffic_west.mp4',
-}
\ No newline at end of file
+}
+
+# --- Shared Detection Engine ---
+# All cameras (across every hosted intersection) share one model instance.
+# Frames that arrive together are run through the model as one batch.
+DETECTION_MAX_BATCH_SIZE = 8
+
+# --- Corridor (Green-Wave) Pre-emption (in milliseconds) ---
+CORRIDOR_MIN_LEAD_MS = 5000           # Minimum time before the ambulance's arrival that its lane turns green
+CORRIDOR_DISCHARGE_HEADWAY_MS = 2000  # Extra lead per queued vehicle, to clear the queue ahead of the ambulance
+CORRIDOR_PREEMPTION_HOLD_MS = 10000   # How long after the expected arrival the pre-emption stays active
+CORRIDOR_MAX_HOPS = 10                # Stop forwarding an announcement after this many intersections
+
+# --- Queue Estimation & Adaptive Green Timing ---
+QUEUE_EWMA_ALPHA = 0.3         # Weight of the newest vehicle count in the smoothed queue length
+QUEUE_RATE_EWMA_ALPHA = 0.2    # Weight of the newest sample in the arrival/discharge rate estimates
+SATURATION_FLOW_VPS = 0.5      # Vehicles per second a lane discharges at on green (~1800 veh/h), used as the prior
+MIN_DISCHARGE_RATE_VPS = 0.1   # Floor for the learned discharge rate so green times stay bounded
+QUEUE_CLEARED_VEHICLES = 0.5   # A smoothed queue below this counts as empty (the phase may gap out)
+STARTUP_LOST_TIME_MS = 2000    # Green time lost to drivers reacting, per phase
+WEBSTER_CYCLE_MIN_MS = 30000   # Bounds on the Webster optimal cycle length
+WEBSTER_CYCLE_MAX_MS = 120000
+GREEN_TIME_POLICY = 'webster'  # 'webster' (adaptive) or 'fixed' (every phase gets GREEN_LIGHT_DURATION_DENSITY, the old controller)
+
+# --- Event History Store ---
+EVENT_STORE_DIR = "event_store"    # Directory holding the compressed event chunks and their time index
+EVENT_STORE_CHUNK_EVENTS = 4096    # Write a chunk once this many events are waiting
+EVENT_STORE_FLUSH_INTERVAL_S = 30  # ...or once the oldest waiting event is this old
+
+# --- Incident Clips ---
+CLIP_DIR = "clips"            # Directory the incident clips are written to
+CLIP_PRE_EVENT_S = 5          # Seconds of footage kept from before a pre-emption
+CLIP_POST_EVENT_S = 5         # Seconds of footage recorded after it
+CLIP_MAX_LENGTH_S = 30        # Pre-emptions close together share one clip, up to this length
+CLIP_RING_FPS = 10            # Frames per second kept per lane (each one JPEG-encoded once)
+CLIP_JPEG_QUALITY = 70        # JPEG quality of the buffered frames
+CLIP_TRIGGER_KINDS = ['preemption']  # Event kinds (see TrafficSystem._record) that export a clip
+
+# --- Dashboard Streams ---
+# Each lane is offered in these variants (/video_feed/<lane>?variant=<name>). A frame is
+# resized and encoded once per variant, however many viewers are watching it.
+STREAM_VARIANTS = {
+    'full':  {'width': RESIZE_WIDTH, 'quality': 80},
+    'thumb': {'width': 240, 'quality': 50},
+}
+DEFAULT_STREAM_VARIANT = 'full'
+STREAM_FPS = 15               # Most frames per second sent to each viewer
+GRID_CELL_WIDTH = 320         # Width of each lane's cell in the composited grid stream (/grid_feed)
+GRID_JPEG_QUALITY = 60
+
+# --- Tiled Far-Field Detection ---
+# At RESIZE_WIDTH a distant ambulance is only a few pixels tall. The tiled pass runs the
+# far end of the approach through the model at full camera resolution, in overlapping tiles.
+TILING_ENABLED = False               # Optional: costs one extra batched forward pass when it runs
+TILING_ROI = (0.0, 0.0, 1.0, 0.5)    # Far-field region (x1, y1, x2, y2) as fractions of the frame
+TILE_SIZE = 480                      # Tile side in raw camera pixels
+TILE_OVERLAP = 0.2                   # Fraction of a tile shared with its neighbour
+TILE_NMS_IOU = 0.5                   # Overlap above which detections from neighbouring tiles are merged
+TILING_UNCERTAIN_CONFIDENCE = 0.5    # A far-field detection below this confidence makes the full frame inconclusive
+TILING_SMALL_OBJECT_PX = 24          # ...as does one shorter than this (raw pixels)
+TILING_MIN_INTERVAL_S = 1.0          # Never tile a lane more often than this
+TILING_REFRESH_S = 5.0               # Tile at least this often anyway, as a tiny ambulance may not be detected at all
+
+# --- Runtime Configuration ---
+# The settings listed in runtime_config.TUNABLE_SETTINGS can be changed while the server
+# runs, through POST /config or by editing this JSON file (a missing file is fine).
+RUNTIME_CONFIG_PATH = "runtime_config.json"
+RUNTIME_CONFIG_POLL_S = 2      # How often the file is checked for changes
+
+# --- Audio-Visual Evidence Fusion ---
+# Pre-emption score = sigmoid(VISUAL*(v - threshold) + AUDIO*a + AGREEMENT*v*a), where v is a lane's
+# decayed detector confidence, a the decayed siren level (both 0..1) and threshold the live
+# EMERGENCY_SCORE_THRESHOLD, so v = threshold alone scores 0.5. See fusion.py.
+FUSION_VISUAL_WEIGHT = 6.7          # How sharply the score rises around the threshold
+FUSION_AUDIO_WEIGHT = 3.0           # A siren alone (a = 1) stays below the pre-emption score
+FUSION_AGREEMENT_WEIGHT = 4.0       # Extra weight when both modalities see it: trips with weaker evidence
+FUSION_PREEMPT_SCORE = 0.5          # A lane is pre-empted at this score...
+FUSION_RELEASE_SCORE = 0.3          # ...and released once it falls below this one
+FUSION_VISUAL_HALF_LIFE_S = 2.0     # Visual evidence halves every this many seconds without new detections
+FUSION_AUDIO_HALF_LIFE_S = 3.0
+FUSION_SIREN_LEVEL = 0.5            # Confirmed-siren evidence at or above this counts as a siren being heard (~3s after the last confirmation)
+FUSION_WEAK_EVIDENCE = 0.1          # Evidence below this counts as "nothing going on"
+FUSION_BOOST_FACTOR = 3             # Detection runs this many times more often while evidence is building
+AUDIO_IDLE_BLOCK_STRIDE = 2         # With weak evidence, only every Nth audio block is analysed
@@ -0,0 +1,132 @@
+# d:\Smart Ambulance Traffic\core\corridor.py
+
+import collections
+import contextlib
+import json
+import threading
+import constants
+
+class LoopbackBus:
+    """
+    In-process publish/subscribe bus standing in for the network between intersections.
+
+    Messages are round-tripped through JSON so that only what would survive a real
+    network hop is delivered. Delivery happens on the publisher's thread.
+    """
+    def __init__(self):
+        self.subscribers = collections.defaultdict(list)
+        self.lock = threading.Lock()
+
+    def subscribe(self, topic, handler):
+        """Registers `handler(message)` to be called for every message on `topic`."""
+        with self.lock:
+            self.subscribers[topic].append(handler)
+
+    def publish(self, topic, message):
+        """Delivers `message` (a JSON-serialisable dict) to every subscriber of `topic`."""
+        payload = json.dumps(message)
+        with self.lock:
+            handlers = list(self.subscribers[topic])
+        for handler in handlers:
+            handler(json.loads(payload))
+
+def load_corridor_links(config_path, intersections):
+    """
+    Loads corridor links from the "corridor" list of an intersections config file:
+
+        {"corridor": [{"from": "<intersection>", "from_lane": "<lane>",
+                       "to": "<intersection>", "to_lane": "<lane>", "travel_time_s": 25}, ...]}
+
+    A link means: an ambulance approaching `from` on `from_lane` reaches `to` on
+    `to_lane` roughly `travel_time_s` seconds later.
+
+    `intersections` is the dict of name -> Intersection loaded from the same file (see
+    load_intersections); every link must use its intersections and lanes. Returns a
+    list of link dicts. Raises ValueError on an invalid link.
+    """
+    with open(config_path) as f:
+        config = json.load(f)
+
+    links = []
+    for link in config.get('corridor', []):
+        missing = {'from', 'from_lane', 'to', 'to_lane', 'travel_time_s'} - set(link)
+        if missing:
+            raise ValueError(f"Corridor link {link} is missing {sorted(missing)}")
+        if link['travel_time_s'] <= 0:
+            raise ValueError(f"Corridor link {link} must have a positive travel_time_s")
+        for end in ('from', 'to'):
+            if link[end] not in intersections:
+                raise ValueError(f"Corridor link {link} uses unknown intersection '{link[end]}'")
+        if link['from_lane'] not in intersections[link['from']].lanes:
+            raise ValueError(f"Corridor link {link} uses unknown lane '{link['from_lane']}' of '{link['from']}'")
+        if link['to_lane'] not in intersections[link['to']].traffic_system.lanes:
+            raise ValueError(f"Corridor link {link} uses unknown lane '{link['to_lane']}' of '{link['to']}'")
+        links.append(link)
+    return links
+
+class CorridorCoordinator:
+    """
+    Links one intersection's TrafficSystem into a green-wave corridor.
+
+    When the local controller sees an ambulance on a lane that feeds a downstream
+    intersection, the expected arrival time is published to that intersection, which
+    clears the approach ahead of time and forwards the announcement further along
+    the corridor (adding each link's travel time).
+    """
+    def __init__(self, name, traffic_system, bus, links, lock=None):
+        """
+        Args:
+            name (str): Name of this intersection on the bus.
+            traffic_system (TrafficSystem): The local controller.
+            bus: Message bus with subscribe(topic, handler) and publish(topic, message).
+            links (list): Corridor links (see load_corridor_links); only those leaving
+                this intersection are used.
+            lock (threading.Lock, optional): Lock guarding `traffic_system`.
+        """
+        self.name = name
+        self.traffic_system = traffic_system
+        self.bus = bus
+        self.lock = lock or contextlib.nullcontext()
+        self.outgoing_links = collections.defaultdict(list) # from_lane -> links leaving it
+        for link in links:
+            if link['from'] == name:
+                self.outgoing_links[link['from_lane']].append(link)
+
+        self.ambulance_was_seen = {lane: False for lane in traffic_system.lanes}
+        self.bus.subscribe(self._topic(name), self._on_message)
+
+    @staticmethod
+    def _topic(intersection_name):
+        return f"corridor/{intersection_name}"
+
+    def tick(self):
+        """
+        Announces ambulances that have just appeared in a lane with downstream links.
+        Call this after TrafficSystem.tick(), without holding the intersection's lock.
+        """
+        with self.lock:
+            seen_now = dict(self.traffic_system.ambulance_in_lane)
+
+        for lane, seen in seen_now.items():
+            if seen and not self.ambulance_was_seen.get(lane):
+                self._forward(lane, arrival_in_ms=0, route=[self.name])
+            self.ambulance_was_seen[lane] = seen
+
+    def _forward(self, lane, arrival_in_ms, route):
+        """Publishes the expected arrival downstream of `lane`, for every outgoing link."""
+        if len(route) > constants.CORRIDOR_MAX_HOPS:
+            return
+        for link in self.outgoing_links.get(lane, []):
+            if link['to'] in route:
+                continue # Never loop back into an intersection the ambulance already passed
+            self.bus.publish(self._topic(link['to']), {
+                'lane': link['to_lane'],
+                'arrival_in_ms': arrival_in_ms + link['travel_time_s'] * 1000,
+                'route': route + [link['to']],
+            })
+
+    def _on_message(self, message):
+        """Handles an announcement from an upstream intersection."""
+        with self.lock:
+            self.traffic_system.request_preemption(message['lane'], message['arrival_in_ms'])
+        self._forward(message['lane'], message['arrival_in_ms'], message['route'])
@@ -0,0 +1,126 @@
+# d:\Smart Ambulance Traffic\core\detection_engine.py
+
+import queue
+import threading
+import time
+import numpy as np
+import constants
+
+class DetectionEngine:
+    """
+    Owns a single YOLO model and runs inference for every camera that shares it.
+
+    Requests are served by one worker thread (the model is not thread-safe), which
+    drains whatever is queued and runs it through the model as a single batch. This
+    lets one process serve many lanes and many intersections with one model copy.
+
+    The model is imported, loaded and (optionally) warmed up on the worker thread, so
+    constructing the engine returns at once and cameras can open in the meantime.
+    Requests made before the model is ready simply wait for it.
+    """
+    def __init__(self, model_path=constants.YOLO_MODEL_PATH, max_batch_size=constants.DETECTION_MAX_BATCH_SIZE,
+                 warmup_shape=None):
+        """
+        Args:
+            model_path (str): YOLO weights to load.
+            max_batch_size (int): Most frames run through the model in one pass.
+            warmup_shape (tuple, optional): (height, width) of a blank frame to run once
+                after loading, so the first real frame doesn't pay the cold-start cost.
+        """
+        self.model_path = model_path
+        self.max_batch_size = max_batch_size
+        self.warmup_shape = warmup_shape
+        self.model = None
+        self.names = {}
+        self.ready = threading.Event() # Set once the model is loaded and warmed up (or failed to load)
+        self.load_error = None
+        self.timings = {} # Step -> seconds, for the startup report
+
+        self.requests = queue.Queue()
+        self.running = True
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def _load(self):
+        """Imports ultralytics, loads the model and runs the warm-up inference."""
+        start = time.perf_counter()
+        from ultralytics import YOLO # Deferred: importing ultralytics/torch takes seconds
+        self.timings['import ultralytics'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.model = YOLO(self.model_path)
+        self.names = self.model.names
+        self.timings['model load'] = time.perf_counter() - start
+
+        if self.warmup_shape is not None:
+            start = time.perf_counter()
+            self.model(np.zeros((*self.warmup_shape, 3), dtype=np.uint8), verbose=False)
+            self.timings['model warm-up'] = time.perf_counter() - start
+
+    def wait_until_ready(self, timeout=None):
+        """Blocks until the model is ready. Returns False on timeout; raises if loading failed."""
+        if not self.ready.wait(timeout):
+            return False
+        if self.load_error is not None:
+            raise self.load_error
+        return True
+
+    def detect(self, frames):
+        """
+        Runs the model on a list of frames and blocks until the results are ready.
+        Returns the list of per-frame results, in the same order as `frames`.
+        """
+        if self.ready.is_set() and self.load_error is not None:
+            raise self.load_error
+        request = {'frames': frames, 'results': None, 'error': None, 'done': threading.Event()}
+        self.requests.put(request)
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+        return request['results']
+
+    def _worker(self):
+        """Loads the model, then collects pending requests into batches and runs them."""
+        try:
+            self._load()
+        except Exception as e:
+            self.load_error = e
+        self.ready.set()
+
+        while self.running:
+            try:
+                batch = [self.requests.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            frame_count = len(batch[0]['frames'])
+            while frame_count < self.max_batch_size:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                frame_count += len(request['frames'])
+
+            all_frames = [frame for request in batch for frame in request['frames']]
+            try:
+                if self.load_error is not None:
+                    raise self.load_error
+                results = self.model(all_frames, verbose=False)
+            except Exception as e:
+                for request in batch:
+                    request['error'] = e
+                    request['done'].set()
+                continue
+
+            # Hand each caller back the slice of results for its own frames.
+            offset = 0
+            for request in batch:
+                request['results'] = results[offset:offset + len(request['frames'])]
+                offset += len(request['frames'])
+                request['done'].set()
+
+    def stop(self):
+        """Signals the worker thread to stop."""
+        self.running = False
+        self.thread.join()
@@ -0,0 +1,124 @@
+# d:\Smart Ambulance Traffic\core\emergency_classifier.py
+
+import collections
+import os
+import threading
+import cv2
+import numpy as np
+import constants
+
+def _box_iou(a, b):
+    """Intersection-over-union of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def _beacon_fraction(hsv):
+    """Fraction of pixels that look like a lit red or blue beacon (bright and saturated)."""
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    lit = (saturation > 120) & (value > 150)
+    red = (hue < 10) | (hue > 170)
+    blue = (hue > 100) & (hue < 130)
+    return float(np.mean(lit & (red | blue)))
+
+class EmergencyVehicleClassifier:
+    """
+    Second stage behind YOLO: decides whether a 'bus' or 'truck' crop is really an
+    emergency vehicle.
+
+    If constants.EMERGENCY_CLASSIFIER_MODEL_PATH exists, it is loaded with cv2.dnn and
+    run once per call on all crops as a single batch. The model takes Nx3xSxS RGB
+    input scaled to [0, 1] and outputs N x 2 logits (other, emergency). Without a
+    model, a colour heuristic is used instead: saturated red or blue markings,
+    scored higher on white/yellow livery. Livery without markings scores 0. The
+    heuristic can't tell markings from red or blue paint, so VisionProcessor caps
+    its scores (see has_model) unless a flashing light bar is also seen.
+    """
+    def __init__(self, model_path=constants.EMERGENCY_CLASSIFIER_MODEL_PATH):
+        self.input_size = constants.EMERGENCY_CLASSIFIER_INPUT_SIZE
+        self.net = cv2.dnn.readNet(model_path) if model_path and os.path.exists(model_path) else None
+        self.lock = threading.Lock() # cv2.dnn nets are not safe to run from several threads at once
+
+    @property
+    def has_model(self):
+        """True if scores come from the model, False if from the colour heuristic."""
+        return self.net is not None
+
+    def score(self, crops):
+        """Returns an emergency-vehicle probability in [0, 1] for each BGR crop."""
+        if not crops:
+            return []
+        if self.net is not None:
+            return self._score_with_model(crops)
+        return [self._score_with_heuristic(crop) for crop in crops]
+
+    def _score_with_model(self, crops):
+        blob = cv2.dnn.blobFromImages(crops, scalefactor=1 / 255.0, size=(self.input_size, self.input_size), swapRB=True)
+        with self.lock:
+            self.net.setInput(blob)
+            logits = self.net.forward().reshape(len(crops), -1)
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return (exp[:, 1] / exp.sum(axis=1)).tolist()
+
+    def _score_with_heuristic(self, crop):
+        small = cv2.resize(crop, (self.input_size, self.input_size))
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        saturation, value = hsv[..., 1], hsv[..., 2]
+        livery = np.mean(((saturation < 40) & (value > 170)) | ((hsv[..., 0] > 20) & (hsv[..., 0] < 35) & (saturation > 120)))
+        markings = _beacon_fraction(hsv)
+        # Markings are required: white or yellow livery alone (delivery trucks, school buses) scores 0.
+        return float(min(markings * 10, 1.0) * (0.4 + 0.6 * min(livery * 1.5, 1.0)))
+
+class LightBarTracker:
+    """
+    Per-lane tracker of candidate vehicles that watches the top of each box for a
+    flashing red/blue light bar across frames.
+
+    Detection only runs on every Nth frame, so the light bar is also sampled on the
+    frames in between (see VisionProcessor.sample_light_bars) to see the flashing.
+    """
+    def __init__(self):
+        self.tracks = [] # Each: {'box', 'history': deque of beacon fractions, 'missed': int}
+
+    def update_boxes(self, boxes):
+        """Matches this detection pass's candidate boxes (full-frame pixels) to existing tracks."""
+        updated = []
+        for box in boxes:
+            best = max(self.tracks, key=lambda track: _box_iou(track['box'], box), default=None)
+            if best is not None and _box_iou(best['box'], box) >= 0.3:
+                self.tracks.remove(best)
+                best['box'] = box
+                best['missed'] = 0
+                updated.append(best)
+            else:
+                updated.append({'box': box, 'history': collections.deque(maxlen=constants.LIGHT_BAR_HISTORY), 'missed': 0})
+        for track in self.tracks:
+            track['missed'] += 1
+            if track['missed'] <= 2: # Keep briefly-occluded vehicles
+                updated.append(track)
+        self.tracks = updated
+
+    def sample(self, frame):
+        """Records the light-bar brightness of every tracked box in a raw frame."""
+        for track in self.tracks:
+            x1, y1, x2, y2 = [int(v) for v in track['box']]
+            bar_height = max(1, (y2 - y1) // 4) # Light bars sit on the roof
+            roof = frame[max(0, y1):max(0, y1) + bar_height, max(0, x1):max(0, x2)]
+            if roof.size:
+                track['history'].append(_beacon_fraction(cv2.cvtColor(roof, cv2.COLOR_BGR2HSV)))
+
+    def is_flashing(self, box):
+        """True if the track matching `box` shows an on/off light-bar pattern."""
+        for track in self.tracks:
+            if _box_iou(track['box'], box) < 0.3 or len(track['history']) < 6:
+                continue
+            history = np.array(track['history'])
+            if history.max() - history.min() < constants.LIGHT_BAR_MIN_SWING:
+                continue
+            # Count on/off transitions around the mid level; a steady lamp has none.
+            lit = history > (history.max() + history.min()) / 2
+            if np.count_nonzero(lit[1:] != lit[:-1]) >= 2:
+                return True
+        return False
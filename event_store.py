@@ -0,0 +1,223 @@
+# d:\Smart Ambulance Traffic\core\event_store.py
+
+import bisect
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+import constants
+
+# --- Chunk File Layout ---
+# MAGIC | uint32 header length | JSON header | zlib-compressed column blobs (in header order)
+MAGIC = b'EVS1'
+NUMERIC_COLUMNS = {'ts': np.int64, 'value': np.float64}
+CODED_COLUMNS = ['intersection', 'kind', 'subject'] # Low-cardinality strings, stored as uint16 codes
+TEXT_COLUMN = 'text'
+INDEX_FILE = 'index.jsonl'
+
+def _encode_chunk(events):
+    """Packs a list of event tuples into one compressed, columnar chunk."""
+    columns = list(zip(*events)) # ts, intersection, kind, subject, value, text
+    header = {'count': len(events), 'columns': []}
+    blobs = []
+
+    timestamps = np.array(columns[0], dtype=np.int64)
+    header['t_min'], header['t_max'] = int(timestamps.min()), int(timestamps.max())
+    # Timestamps are nearly sorted, so deltas compress far better than raw values.
+    blobs.append(('ts', np.diff(timestamps, prepend=0).astype(np.int64).tobytes()))
+
+    for name, values in zip(CODED_COLUMNS, columns[1:4]):
+        dictionary = sorted(set(values))
+        codes = {value: code for code, value in enumerate(dictionary)}
+        header.setdefault('dictionaries', {})[name] = dictionary
+        blobs.append((name, np.array([codes[v] for v in values], dtype=np.uint16).tobytes()))
+
+    blobs.append(('value', np.array(columns[4], dtype=np.float64).tobytes()))
+    blobs.append((TEXT_COLUMN, json.dumps(columns[5]).encode('utf-8')))
+
+    payload = b''
+    for name, blob in blobs:
+        compressed = zlib.compress(blob, 6)
+        header['columns'].append({'name': name, 'size': len(compressed)})
+        payload += compressed
+    header_bytes = json.dumps(header).encode('utf-8')
+    return MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes + payload, header
+
+def _read_header(f):
+    if f.read(4) != MAGIC:
+        raise ValueError("Not an event store chunk")
+    (header_length,) = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(header_length))
+
+def _decode_columns(f, header, wanted):
+    """Decompresses only the `wanted` columns of a chunk whose header was just read."""
+    columns = {}
+    for column in header['columns']:
+        blob = f.read(column['size'])
+        name = column['name']
+        if name not in wanted:
+            continue
+        raw = zlib.decompress(blob)
+        if name == 'ts':
+            columns[name] = np.cumsum(np.frombuffer(raw, dtype=np.int64))
+        elif name in NUMERIC_COLUMNS:
+            columns[name] = np.frombuffer(raw, dtype=NUMERIC_COLUMNS[name])
+        elif name in CODED_COLUMNS:
+            columns[name] = np.frombuffer(raw, dtype=np.uint16)
+        else:
+            columns[name] = json.loads(raw)
+    return columns
+
+class EventStore:
+    """
+    Local append-only history of detections, phase changes, sirens, alerts and
+    ambulance pre-emptions.
+
+    append() only puts the event on a queue, so it is cheap enough for the detection
+    and control threads. A background writer groups events into columnar chunks
+    (delta-coded timestamps, dictionary-coded strings, zlib per column). Each chunk
+    is written atomically and then listed in an append-only time index. Range queries
+    only open chunks whose time span overlaps the range, and skip chunks that don't
+    contain the requested kind without decompressing them.
+    """
+    def __init__(self, directory=constants.EVENT_STORE_DIR, chunk_events=constants.EVENT_STORE_CHUNK_EVENTS,
+                 flush_interval_s=constants.EVENT_STORE_FLUSH_INTERVAL_S):
+        self.directory = directory
+        self.chunk_events = chunk_events
+        self.flush_interval_s = flush_interval_s
+        os.makedirs(directory, exist_ok=True)
+
+        # --- Time Index (kept in memory, sorted by t_min) ---
+        self.index = []
+        self.index_t_min = []
+        self.max_chunk_span_ms = 0
+        self.index_lock = threading.Lock()
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    if line.strip():
+                        self._add_to_index(json.loads(line))
+
+        self.pending = [] # Events taken off the queue but not yet written
+        self.pending_lock = threading.Lock()
+        self.events = queue.Queue()
+        self.running = True
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def append(self, kind, intersection='', subject='', value=0.0, text='', ts_ms=None):
+        """
+        Queues one event. `kind` is e.g. 'detection', 'ambulance', 'phase', 'siren',
+        'alert', 'preemption' or 'announcement' (a corridor arrival notice); `subject`
+        is the lane or phase it concerns.
+        """
+        if ts_ms is None:
+            ts_ms = time.time() * 1000
+        self.events.put((int(ts_ms), intersection, kind, subject, float(value), text))
+
+    def _add_to_index(self, entry):
+        with self.index_lock:
+            position = bisect.bisect_right(self.index_t_min, entry['t_min'])
+            self.index.insert(position, entry)
+            self.index_t_min.insert(position, entry['t_min'])
+            self.max_chunk_span_ms = max(self.max_chunk_span_ms, entry['t_max'] - entry['t_min'])
+
+    def _writer(self):
+        """Background thread: collects queued events and writes them out chunk by chunk."""
+        last_flush = time.monotonic()
+        while self.running or not self.events.empty():
+            try:
+                event = self.events.get(timeout=0.5)
+                with self.pending_lock:
+                    self.pending.append(event)
+            except queue.Empty:
+                pass
+            with self.pending_lock:
+                pending_count = len(self.pending)
+            if pending_count >= self.chunk_events or (pending_count and time.monotonic() - last_flush > self.flush_interval_s):
+                self.flush()
+                last_flush = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        """Writes all pending events as one chunk and records it in the index."""
+        with self.pending_lock:
+            events, self.pending = self.pending, []
+        if not events:
+            return
+        events.sort(key=lambda event: event[0])
+        data, header = _encode_chunk(events)
+
+        file_name = f"chunk-{header['t_min']}-{len(self.index):06d}.evs"
+        temp_path = os.path.join(self.directory, file_name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, os.path.join(self.directory, file_name)) # Readers never see a partial chunk
+
+        entry = {'file': file_name, 't_min': header['t_min'], 't_max': header['t_max'], 'count': header['count'],
+                 'kinds': header['dictionaries']['kind']}
+        with open(os.path.join(self.directory, INDEX_FILE), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self._add_to_index(entry)
+
+    def _chunks_overlapping(self, start_ms, end_ms):
+        """Index entries whose [t_min, t_max] overlaps [start_ms, end_ms], found by bisection."""
+        with self.index_lock:
+            first = bisect.bisect_left(self.index_t_min, start_ms - self.max_chunk_span_ms)
+            last = bisect.bisect_right(self.index_t_min, end_ms)
+            return [entry for entry in self.index[first:last] if entry['t_max'] >= start_ms]
+
+    def query(self, start_ms, end_ms, kinds=None, intersection=None, subject=None):
+        """
+        Returns the events in [start_ms, end_ms] as dicts, oldest first, optionally
+        filtered by kind(s), intersection and subject. Includes events not yet written.
+        """
+        kinds = set(kinds) if kinds else None
+        matches = []
+        for entry in self._chunks_overlapping(start_ms, end_ms):
+            if kinds and not kinds & set(entry['kinds']):
+                continue # Chunk holds none of the wanted kinds; never decompressed
+            with open(os.path.join(self.directory, entry['file']), 'rb') as f:
+                header = _read_header(f)
+                columns = _decode_columns(f, header, {'ts', 'value', TEXT_COLUMN, *CODED_COLUMNS})
+            dictionaries = header['dictionaries']
+
+            mask = (columns['ts'] >= start_ms) & (columns['ts'] <= end_ms)
+            filters = {'kind': kinds, 'intersection': {intersection} if intersection else None,
+                       'subject': {subject} if subject else None}
+            for name, wanted in filters.items():
+                if wanted:
+                    wanted_codes = [code for code, value in enumerate(dictionaries[name]) if value in wanted]
+                    mask &= np.isin(columns[name], wanted_codes)
+
+            for row in np.flatnonzero(mask):
+                matches.append({
+                    'ts_ms': int(columns['ts'][row]),
+                    'intersection': dictionaries['intersection'][columns['intersection'][row]],
+                    'kind': dictionaries['kind'][columns['kind'][row]],
+                    'subject': dictionaries['subject'][columns['subject'][row]],
+                    'value': float(columns['value'][row]),
+                    'text': columns[TEXT_COLUMN][row],
+                })
+
+        with self.pending_lock:
+            pending = list(self.pending)
+        for ts_ms, event_intersection, kind, event_subject, value, text in pending:
+            if (start_ms <= ts_ms <= end_ms and (not kinds or kind in kinds)
+                    and (not intersection or event_intersection == intersection)
+                    and (not subject or event_subject == subject)):
+                matches.append({'ts_ms': ts_ms, 'intersection': event_intersection, 'kind': kind,
+                                'subject': event_subject, 'value': value, 'text': text})
+
+        matches.sort(key=lambda event: event['ts_ms'])
+        return matches
+
+    def stop(self):
+        """Writes out everything still queued and stops the writer thread."""
+        self.running = False
+        self.thread.join()
@@ -0,0 +1,104 @@
+# d:\Smart Ambulance Traffic\core\fusion.py
+
+import math
+import time
+import constants
+from runtime_config import RuntimeConfig
+
+def _decayed(evidence, now, half_life_s):
+    """Value of an (score, timestamp) evidence pair after exponential decay to `now`."""
+    score, timestamp = evidence
+    return score * 0.5 ** (max(0.0, now - timestamp) / half_life_s)
+
+class EvidenceFusion:
+    """
+    Fuses visual and audio evidence of an emergency vehicle into a per-lane
+    pre-emption score in [0, 1].
+
+    Visual evidence is per lane (the detector's or second-stage classifier's
+    confidence); audio evidence is shared by the junction (siren band energy, as
+    one microphone hears every approach). Both decay with their own half-life, so
+    a single stale detection or a siren that has stopped fades out instead of
+    holding the junction.
+
+    The score is a logistic model, sigmoid(w_v*(v - threshold) + w_a*a + w_va*v*a),
+    with the weights in constants.py and the live EMERGENCY_SCORE_THRESHOLD, so a
+    visual confidence at the threshold alone scores 0.5 (the old behaviour) and
+    tuning the threshold at runtime moves the pre-emption point with it. The
+    interaction term makes the score trip faster when both modalities agree: a weak
+    candidate that would not pre-empt on its own does so while a siren is heard. A
+    siren alone never pre-empts a particular lane (see runtime_config._check_consistency).
+    """
+    def __init__(self, lanes, clock=time.time, config=None):
+        """
+        Args:
+            lanes (list): Lane names to keep visual evidence for.
+            clock (callable): Returns the current time in seconds.
+            config (RuntimeConfig, optional): Source of the live EMERGENCY_SCORE_THRESHOLD.
+                Defaults to the value in constants.py.
+        """
+        self.clock = clock
+        self.config = config or RuntimeConfig()
+        self.visual = {lane: (0.0, 0.0) for lane in lanes} # lane -> (confidence, seconds)
+        self.audio = (0.0, 0.0) # Any siren evidence, including single audio blocks; used by score()
+        self.siren = (0.0, 0.0) # Confirmed sirens only (SIREN_CONFIRMATION_COUNT blocks); used by siren_level()
+        self.tripped = {lane: False for lane in lanes}
+
+    def add_visual(self, lane, confidence):
+        """Adds a detection pass's emergency-vehicle confidence (0 if none was seen) for a lane."""
+        now = self.clock()
+        decayed = _decayed(self.visual[lane], now, constants.FUSION_VISUAL_HALF_LIFE_S)
+        self.visual[lane] = (max(decayed, float(confidence)), now) # A new weak reading doesn't erase a recent strong one
+
+    def add_audio(self, level):
+        """Adds a siren evidence level in [0, 1] (e.g. from the audio band-energy analysis)."""
+        now = self.clock()
+        decayed = _decayed(self.audio, now, constants.FUSION_AUDIO_HALF_LIFE_S)
+        self.audio = (max(decayed, float(level)), now)
+
+    def add_confirmed_siren(self):
+        """Adds a siren confirmed by the audio analysis. It also counts as full audio evidence for score()."""
+        self.add_audio(1.0)
+        self.siren = (1.0, self.clock())
+
+    def siren_level(self):
+        """Decayed level of the last confirmed siren, in [0, 1]. Unconfirmed audio blocks don't raise it."""
+        return _decayed(self.siren, self.clock(), constants.FUSION_AUDIO_HALF_LIFE_S)
+
+    def score(self, lane):
+        """Calibrated pre-emption score of a lane, from the decayed evidence of both modalities."""
+        now = self.clock()
+        visual = _decayed(self.visual[lane], now, constants.FUSION_VISUAL_HALF_LIFE_S)
+        audio = _decayed(self.audio, now, constants.FUSION_AUDIO_HALF_LIFE_S)
+        threshold = self.config.current()['EMERGENCY_SCORE_THRESHOLD']
+        logit = (constants.FUSION_VISUAL_WEIGHT * (visual - threshold)
+                 + constants.FUSION_AUDIO_WEIGHT * audio + constants.FUSION_AGREEMENT_WEIGHT * visual * audio)
+        return 1 / (1 + math.exp(-logit))
+
+    def is_emergency(self, lane):
+        """
+        True while the lane should be pre-empted. Trips at FUSION_PREEMPT_SCORE and only
+        releases below FUSION_RELEASE_SCORE, so a score hovering near the line doesn't flicker.
+        """
+        threshold = constants.FUSION_RELEASE_SCORE if self.tripped[lane] else constants.FUSION_PREEMPT_SCORE
+        self.tripped[lane] = self.score(lane) >= threshold
+        return self.tripped[lane]
+
+    def evidence_is_weak(self, lane=None):
+        """True if there is next to no evidence for `lane` (or, without a lane, for any lane)."""
+        lanes = [lane] if lane is not None else list(self.visual)
+        now = self.clock()
+        if _decayed(self.audio, now, constants.FUSION_AUDIO_HALF_LIFE_S) >= constants.FUSION_WEAK_EVIDENCE:
+            return False
+        return all(_decayed(self.visual[l], now, constants.FUSION_VISUAL_HALF_LIFE_S) < constants.FUSION_WEAK_EVIDENCE
+                   for l in lanes)
+
+    def detection_interval(self, lane, base_interval):
+        """
+        Frames between detection passes for a lane: the configured interval while the
+        evidence is weak, shortened by FUSION_BOOST_FACTOR while something is building,
+        so a suspected ambulance is confirmed (or ruled out) sooner.
+        """
+        if self.evidence_is_weak(lane):
+            return base_interval
+        return max(1, base_interval // constants.FUSION_BOOST_FACTOR)
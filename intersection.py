@@ -0,0 +1,86 @@
+# d:\Smart Ambulance Traffic\core\intersection.py
+
+import json
+import threading
+from phase_plan import PhasePlan
+from traffic_system import TrafficSystem
+
+DEFAULT_INTERSECTION = 'main'
+
+class Intersection:
+    """
+    One junction hosted by the service: its controller, camera sources and latest frames.
+    Each intersection has its own lock so busy junctions don't block each other.
+    """
+    def __init__(self, name, video_sources, phase_plan=None, microphone=False, config=None):
+        """
+        Args:
+            name (str): Name of the junction, used in its /i/<name>/ routes.
+            video_sources (dict): lane -> video path or camera index.
+            phase_plan (PhasePlan, optional): See TrafficSystem.
+            microphone (bool): True if the local siren microphone belongs to this junction.
+            config (RuntimeConfig, optional): Live-tunable settings shared with the rest of
+                the server. Defaults to the values in constants.py.
+        """
+        self.name = name
+        self.video_sources = video_sources # lane -> video path or camera index
+        self.lanes = list(video_sources)
+        self.microphone = microphone # True if the local siren microphone belongs to this junction
+        self.traffic_system = TrafficSystem(lanes=self.lanes, phase_plan=phase_plan, config=config)
+        self.last_frames = {}
+        self.lock = threading.Lock()
+
+def _parse_source(source):
+    """Camera indices may be written as numbers or digit strings in the config."""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+def load_intersections(config_path, runtime_config=None):
+    """
+    Loads the intersections to host from a JSON config file of the form:
+
+        {"intersections": {"<name>": {"lanes": {"<lane>": "<video source>", ...},
+                                      "phases": {"<phase>": ["<lane>", ...], ...},
+                                      "conflicts": [["<lane>", "<lane>"], ...],
+                                      "microphone": false}}}
+
+    A phase may also be a dict with "lanes", "min_green_s", "max_green_s" and
+    "pedestrian" (see PhasePlan.from_config). Pedestrian phases may use signal groups
+    that have no camera, e.g. "crosswalk_north".
+
+    `runtime_config` (RuntimeConfig, optional) is passed to every intersection's controller.
+
+    Returns a dict of name -> Intersection. Raises ValueError on an invalid layout.
+    """
+    with open(config_path) as f:
+        config = json.load(f)
+
+    intersections = {}
+    for name, spec in config.get('intersections', {}).items():
+        lanes = {lane: _parse_source(source) for lane, source in spec.get('lanes', {}).items()}
+        phases = spec.get('phases')
+        if not lanes:
+            raise ValueError(f"Intersection '{name}' has no lanes.")
+        if not phases:
+            raise ValueError(f"Intersection '{name}' has no phases.")
+
+        try:
+            phase_plan = PhasePlan.from_config(phases, spec.get('conflicts'))
+        except ValueError as e:
+            raise ValueError(f"Intersection '{name}': {e}")
+
+        for phase in phase_plan.phases.values():
+            unknown = set(phase.lanes) - set(lanes)
+            if unknown and not phase.pedestrian:
+                raise ValueError(f"Phase '{phase.name}' of intersection '{name}' uses unknown lanes: {sorted(unknown)}")
+        unserved = set(lanes) - set(phase_plan.lanes)
+        if unserved:
+            raise ValueError(f"Lanes of intersection '{name}' never get green: {sorted(unserved)}")
+
+        intersections[name] = Intersection(name, lanes, phase_plan=phase_plan, microphone=spec.get('microphone', False),
+                                          config=runtime_config)
+
+    if not intersections:
+        raise ValueError(f"No intersections defined in '{config_path}'.")
+    return intersections
@@ -0,0 +1,108 @@
+# d:\Smart Ambulance Traffic\core\phase_plan.py
+
+import itertools
+import constants
+
+class Phase:
+    """
+    One signal phase: a set of lanes (signal groups) that are green together.
+    """
+    def __init__(self, name, lanes, min_green_ms=None, max_green_ms=None, pedestrian=False):
+        self.name = name
+        self.lanes = list(lanes)
+        self.min_green_ms = constants.PHASE_MIN_GREEN_MS if min_green_ms is None else min_green_ms
+        self.max_green_ms = constants.PHASE_MAX_GREEN_MS if max_green_ms is None else max_green_ms
+        self.pedestrian = pedestrian # Pedestrian phases are served on a push-button call, not on camera demand
+
+class PhasePlan:
+    """
+    A data-driven signal plan: the phases of a junction plus the lane conflict matrix.
+
+    Phases are not served in a fixed order. Each time the junction is all-red, the
+    controller asks the plan for the phase with the highest demand.
+    """
+    def __init__(self, phases, conflicts=None):
+        """
+        Args:
+            phases (list): Phase objects, in tie-break order.
+            conflicts (iterable, optional): Pairs of lanes that must never be green together.
+                Defaults to "every lane conflicts with every lane outside its own phase".
+
+        Raises:
+            ValueError: If the plan is empty, names repeat or a phase contains conflicting lanes.
+        """
+        if not phases:
+            raise ValueError("A phase plan needs at least one phase.")
+        self.phases = {}
+        for phase in phases:
+            if phase.name in self.phases:
+                raise ValueError(f"Phase '{phase.name}' is defined twice.")
+            if not phase.lanes:
+                raise ValueError(f"Phase '{phase.name}' has no lanes.")
+            if phase.min_green_ms > phase.max_green_ms:
+                raise ValueError(f"Phase '{phase.name}' has a min green longer than its max green.")
+            self.phases[phase.name] = phase
+
+        # Lanes in plan order, each listed once.
+        self.lanes = list(dict.fromkeys(lane for phase in phases for lane in phase.lanes))
+
+        self.conflicts = {frozenset(pair) for pair in (conflicts or [])}
+        for phase in phases:
+            for pair in itertools.combinations(phase.lanes, 2):
+                if frozenset(pair) in self.conflicts:
+                    raise ValueError(f"Phase '{phase.name}' turns conflicting lanes {list(pair)} green together.")
+
+    @classmethod
+    def from_config(cls, phases, conflicts=None):
+        """
+        Builds a plan from config data. Each phase is either a list of lanes or a dict:
+        {"lanes": [...], "min_green_s": 5, "max_green_s": 30, "pedestrian": false}.
+        """
+        plan_phases = []
+        for name, spec in phases.items():
+            if isinstance(spec, list):
+                spec = {'lanes': spec}
+            plan_phases.append(Phase(
+                name, spec.get('lanes', []),
+                min_green_ms=spec['min_green_s'] * 1000 if 'min_green_s' in spec else None,
+                max_green_ms=spec['max_green_s'] * 1000 if 'max_green_s' in spec else None,
+                pedestrian=spec.get('pedestrian', False),
+            ))
+        return cls(plan_phases, conflicts)
+
+    @classmethod
+    def default(cls, lanes):
+        """The classic North-South / East-West split for a 4-way junction, else one phase per lane."""
+        if set(lanes) == {'north', 'south', 'east', 'west'}:
+            return cls([Phase('NS', ['north', 'south']), Phase('EW', ['east', 'west'])])
+        return cls([Phase(lane.upper(), [lane]) for lane in lanes])
+
+    def phase_map(self):
+        """Phase name -> lanes, for display and status reporting."""
+        return {name: list(phase.lanes) for name, phase in self.phases.items()}
+
+    def conflicts_with(self, lane_a, lane_b):
+        """True if the two lanes may never be green at the same time."""
+        if self.conflicts:
+            return frozenset((lane_a, lane_b)) in self.conflicts
+        # Without an explicit matrix, only lanes sharing a phase are compatible.
+        return not any(lane_a in phase.lanes and lane_b in phase.lanes for phase in self.phases.values())
+
+    def choose_next_phase(self, demands, current_phase=None):
+        """
+        Returns the phase with the highest demand, or None if nothing is waiting.
+
+        Phases other than `current_phase` are preferred, so a phase that just ended is
+        only re-served when no other phase has demand. Ties go to the phase that comes
+        next after `current_phase` in plan order.
+        """
+        names = list(self.phases)
+        start = names.index(current_phase) + 1 if current_phase in self.phases else 0
+        rotation = names[start:] + names[:start] # Plan order, starting after the current phase
+
+        candidates = [name for name in rotation if name != current_phase and demands.get(name, 0) > 0]
+        if not candidates and demands.get(current_phase, 0) > 0:
+            candidates = [current_phase]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda name: (demands[name], -rotation.index(name)))
@@ -0,0 +1,83 @@
+# d:\Smart Ambulance Traffic\core\queue_estimator.py
+
+import constants
+
+class QueueEstimator:
+    """
+    Smooths the raw per-frame vehicle counts of each lane into a queue length and
+    learns each lane's arrival and discharge rates from how that queue changes.
+
+    While a lane is red its queue grows at the arrival rate; while it is green it
+    shrinks at (discharge rate - arrival rate). Both rates are EWMA-smoothed.
+    """
+    def __init__(self, lanes, alpha=constants.QUEUE_EWMA_ALPHA, rate_alpha=constants.QUEUE_RATE_EWMA_ALPHA):
+        self.alpha = alpha
+        self.rate_alpha = rate_alpha
+        self.queue = {lane: 0.0 for lane in lanes}                                    # vehicles
+        self.arrival_rate = {lane: 0.0 for lane in lanes}                             # vehicles/s
+        self.discharge_rate = {lane: constants.SATURATION_FLOW_VPS for lane in lanes} # vehicles/s
+        self.last_update_ms = {lane: None for lane in lanes}
+
+    def update(self, lane, vehicle_count, now_ms, is_green):
+        """Feeds one detection result for `lane`, taken at `now_ms`."""
+        previous_queue = self.queue[lane]
+        last_update_ms = self.last_update_ms[lane]
+        self.last_update_ms[lane] = now_ms
+
+        if last_update_ms is None:
+            self.queue[lane] = float(vehicle_count) # First sample: nothing to smooth against
+            return
+        self.queue[lane] = self.alpha * vehicle_count + (1 - self.alpha) * previous_queue
+
+        elapsed_s = (now_ms - last_update_ms) / 1000
+        if elapsed_s <= 0:
+            return
+        growth = (self.queue[lane] - previous_queue) / elapsed_s
+
+        if is_green:
+            # Only a lane that still has a queue discharges at its saturation flow.
+            if previous_queue > constants.QUEUE_CLEARED_VEHICLES:
+                observed = max(constants.MIN_DISCHARGE_RATE_VPS, self.arrival_rate[lane] - growth)
+                self.discharge_rate[lane] += self.rate_alpha * (observed - self.discharge_rate[lane])
+        else:
+            self.arrival_rate[lane] += self.rate_alpha * (max(0.0, growth) - self.arrival_rate[lane])
+
+    def phase_queue(self, lanes):
+        """Total smoothed queue over a phase's lanes."""
+        return sum(self.queue.get(lane, 0.0) for lane in lanes)
+
+    def clearance_time_ms(self, lanes):
+        """Green time needed to discharge the current queue of the slowest lane, plus start-up loss."""
+        clearance_s = max(
+            (self.queue.get(lane, 0.0) / self.discharge_rate[lane] for lane in lanes if lane in self.queue),
+            default=0.0,
+        )
+        return constants.STARTUP_LOST_TIME_MS + clearance_s * 1000
+
+    def flow_ratio(self, lanes):
+        """Webster's critical flow ratio y of a phase: the highest arrival/saturation ratio of its lanes."""
+        return max(
+            (self.arrival_rate[lane] / self.discharge_rate[lane] for lane in lanes if lane in self.queue),
+            default=0.0,
+        )
+
+def webster_green_times(phase_plan, estimator, yellow_ms=constants.YELLOW_LIGHT_DURATION):
+    """
+    Splits Webster's optimal cycle C0 = (1.5 L + 5) / (1 - Y) between the phases of
+    `phase_plan` in proportion to their critical flow ratios. `yellow_ms` is the
+    yellow time lost per phase.
+    Returns phase name -> effective green in milliseconds (before min/max clamping).
+    """
+    phases = phase_plan.phases
+    flow_ratios = {name: 0.0 if phase.pedestrian else estimator.flow_ratio(phase.lanes) for name, phase in phases.items()}
+    total_ratio = min(sum(flow_ratios.values()), 0.95) # Y >= 1 means oversaturated; cap to keep C0 finite
+
+    lost_time_s = len(phases) * (yellow_ms + constants.STARTUP_LOST_TIME_MS) / 1000
+    cycle_s = (1.5 * lost_time_s + 5) / (1 - total_ratio)
+    cycle_s = min(max(cycle_s, constants.WEBSTER_CYCLE_MIN_MS / 1000), constants.WEBSTER_CYCLE_MAX_MS / 1000)
+
+    effective_green_s = max(cycle_s - lost_time_s, 0.0)
+    ratio_sum = sum(flow_ratios.values())
+    if ratio_sum == 0:
+        return {name: effective_green_s / len(phases) * 1000 for name in phases}
+    return {name: effective_green_s * ratio / ratio_sum * 1000 for name, ratio in flow_ratios.items()}
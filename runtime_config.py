@@ -0,0 +1,148 @@
+# d:\Smart Ambulance Traffic\core\runtime_config.py
+
+import json
+import os
+import threading
+import time
+import types
+import constants
+
+# ===================================================================
+# TUNABLE SETTINGS
+# Settings that may be changed while the server runs. Their defaults come from
+# constants.py; everything else in constants.py still needs a restart.
+# ===================================================================
+def _number(kind, low, high):
+    def validate(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError("must be a number")
+        if kind is int and value != int(value):
+            raise ValueError("must be a whole number")
+        if not low <= value <= high:
+            raise ValueError(f"must be between {low} and {high}")
+        return kind(value)
+    return validate
+
+def _boolean(value):
+    if not isinstance(value, bool):
+        raise ValueError("must be true or false")
+    return value
+
+def _frequency_range(value):
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError("must be a [low, high] pair in Hz")
+    low, high = [_number(float, 20, 20000)(v) for v in value]
+    if low >= high:
+        raise ValueError("low must be below high")
+    return (low, high)
+
+TUNABLE_SETTINGS = {
+    # Vision
+    'PROCESS_EVERY_NTH_FRAME': _number(int, 1, 300),
+    'EMERGENCY_CLASSIFIER_ENABLED': _boolean,
+    'EMERGENCY_SCORE_THRESHOLD': _number(float, 0, 1),
+    'EMERGENCY_FLASH_SCORE_THRESHOLD': _number(float, 0, 1),
+    'TILING_ENABLED': _boolean,
+    # Control
+    'HIGH_DENSITY_THRESHOLD': _number(int, 1, 1000),
+    'YELLOW_LIGHT_DURATION': _number(int, 1000, 10000),
+    'GREEN_LIGHT_GRACE_PERIOD': _number(int, 0, 60000),
+    'PEDESTRIAN_CALL_DEMAND': _number(float, 0, 1000),
+    # Audio
+    'SIREN_FREQUENCY_RANGE': _frequency_range,
+    'SIREN_LOUDNESS_THRESHOLD': _number(float, 0, 1e6),
+    'SIREN_DETECTION_WINDOW': _number(int, 1, 100),
+    'SIREN_CONFIRMATION_COUNT': _number(int, 1, 100),
+}
+
+def _check_consistency(values):
+    """Checks between settings that are only wrong in combination."""
+    if values['SIREN_CONFIRMATION_COUNT'] > values['SIREN_DETECTION_WINDOW']:
+        raise ValueError("SIREN_CONFIRMATION_COUNT can't exceed SIREN_DETECTION_WINDOW")
+    if values['EMERGENCY_FLASH_SCORE_THRESHOLD'] > values['EMERGENCY_SCORE_THRESHOLD']:
+        raise ValueError("EMERGENCY_FLASH_SCORE_THRESHOLD can't exceed EMERGENCY_SCORE_THRESHOLD")
+    # The fused score (fusion.py) is sigmoid(VISUAL*(v - threshold) + AUDIO*a + ...): below this
+    # threshold a siren with no vehicle in view (v = 0, a = 1) would pre-empt every lane.
+    if values['EMERGENCY_SCORE_THRESHOLD'] * constants.FUSION_VISUAL_WEIGHT <= constants.FUSION_AUDIO_WEIGHT:
+        raise ValueError(f"EMERGENCY_SCORE_THRESHOLD must be above "
+                         f"{constants.FUSION_AUDIO_WEIGHT / constants.FUSION_VISUAL_WEIGHT:.2f}, or a siren alone would pre-empt every lane")
+
+class RuntimeConfig:
+    """
+    Versioned, validated settings shared by the vision, audio and control threads.
+
+    Each version is an immutable snapshot. Readers take one with current() at the
+    start of a frame, audio block or tick and use it throughout, so they never see
+    half of an update. An update validates the complete new settings, then swaps
+    in a new snapshot with a single assignment. Threads pick it up on their next
+    frame or tick; nothing is restarted and no model is reloaded.
+    """
+    def __init__(self):
+        self.defaults = {name: validate(getattr(constants, name)) for name, validate in TUNABLE_SETTINGS.items()}
+        self.lock = threading.Lock() # Serialises writers; readers never lock
+        self.snapshot = types.MappingProxyType({'version': 1, 'source': 'constants.py', **self.defaults})
+
+    def current(self):
+        """The latest snapshot: a read-only mapping of setting name -> value, plus 'version'."""
+        return self.snapshot
+
+    def values(self):
+        """The current settings as a plain dict (e.g. for the /config API)."""
+        return dict(self.snapshot)
+
+    def update(self, changes, source='api', reset=False):
+        """
+        Applies `changes` (setting name -> new value) as a new version.
+
+        Args:
+            changes (dict): Settings to change.
+            source (str): Where the change came from, kept in the snapshot for the logs.
+            reset (bool): Start from the constants.py defaults instead of the current
+                settings, so settings missing from `changes` go back to their default.
+
+        Raises:
+            ValueError: If a name is unknown or a value is invalid. Nothing is changed then.
+        """
+        if not isinstance(changes, dict):
+            raise ValueError("Settings must be a JSON object of name -> value.")
+        unknown = set(changes) - set(TUNABLE_SETTINGS)
+        if unknown:
+            raise ValueError(f"Not tunable at runtime: {sorted(unknown)}")
+
+        with self.lock:
+            values = dict(self.defaults if reset else self.snapshot)
+            for name, value in changes.items():
+                try:
+                    values[name] = TUNABLE_SETTINGS[name](value)
+                except ValueError as e:
+                    raise ValueError(f"{name} {e}")
+            _check_consistency(values)
+            values['version'] = self.snapshot['version'] + 1
+            values['source'] = source
+            self.snapshot = types.MappingProxyType(values)
+        print(f"🔧 Runtime config v{values['version']} applied from {source}: {changes}")
+        return self.snapshot
+
+    def load_file(self, path):
+        """Applies a JSON file of settings on top of the defaults (see update)."""
+        with open(path) as f:
+            return self.update(json.load(f), source=path, reset=True)
+
+    def watch_file(self, path, stop_event, poll_interval_s=constants.RUNTIME_CONFIG_POLL_S):
+        """
+        Thread body: re-applies `path` whenever its modification time changes. An invalid
+        file is reported and ignored, leaving the running settings untouched.
+        """
+        last_mtime = None
+        while not stop_event.is_set():
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != last_mtime:
+                last_mtime = mtime
+                try:
+                    self.load_file(path)
+                except (OSError, ValueError) as e: # json.JSONDecodeError is a ValueError
+                    print(f"⚠️ Ignoring runtime config '{path}': {e}")
+            time.sleep(poll_interval_s)
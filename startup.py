@@ -0,0 +1,71 @@
+# d:\Smart Ambulance Traffic\core\startup.py
+
+# ===================================================================
+# STARTUP SEQUENCING & TIMING
+# Import this module first so PROCESS_START is as close as possible to
+# the moment the interpreter began running the application.
+# ===================================================================
+
+import importlib
+import threading
+import time
+
+PROCESS_START = time.perf_counter()
+
+class StartupReport:
+    """
+    Records when each startup milestone was reached (seconds since PROCESS_START)
+    and how long individual steps took, so cold-start regressions are visible.
+    """
+    def __init__(self):
+        self.milestones = {} # name -> seconds since process start (first occurrence only)
+        self.durations = {}  # name -> seconds the step itself took
+        self.lock = threading.Lock()
+
+    def mark(self, name):
+        """Records that a milestone has been reached. Later calls for the same name are ignored."""
+        with self.lock:
+            if name not in self.milestones:
+                self.milestones[name] = time.perf_counter() - PROCESS_START
+
+    def record_duration(self, name, seconds):
+        with self.lock:
+            self.durations[name] = seconds
+
+    def has(self, name):
+        with self.lock:
+            return name in self.milestones
+
+    def as_dict(self):
+        with self.lock:
+            return {'milestones_s': dict(self.milestones), 'durations_s': dict(self.durations)}
+
+    def print_summary(self):
+        """Prints every milestone in the order it was reached."""
+        report = self.as_dict()
+        print("--- Startup Timings ---")
+        for name, at in sorted(report['milestones_s'].items(), key=lambda item: item[1]):
+            print(f"  {at:7.2f}s  {name}")
+        for name, seconds in report['durations_s'].items():
+            print(f"  ({name}: {seconds:.2f}s)")
+
+def preload_modules(module_names, report):
+    """
+    Imports heavy modules in a background thread so the import cost overlaps with
+    whatever the main thread does meanwhile (file dialogs, pre-flight checks).
+    Returns the started thread.
+    """
+    def _preload():
+        for name in module_names:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"Warning: Could not preload '{name}' ({e}).")
+                continue
+            report.record_duration(f"import {name}", time.perf_counter() - start)
+        report.mark("heavy imports done")
+
+    thread = threading.Thread(target=_preload, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,90 @@
+# d:\Smart Ambulance Traffic\core\streams.py
+
+import math
+import threading
+import time
+import numpy as np
+import constants
+
+class StreamHub:
+    """
+    Shared JPEG encoder behind the dashboard's MJPEG streams.
+
+    Every viewer of a lane used to encode its own full-size copy of each frame. The
+    hub instead encodes each new frame once per variant (see
+    constants.STREAM_VARIANTS) and hands the same bytes to every viewer. The grid
+    stream composites all lanes of an intersection into one low-resolution image,
+    rebuilt at most once per frame interval, so an overview page costs one small
+    encode instead of one full encode per camera.
+    """
+    def __init__(self, variants=constants.STREAM_VARIANTS, fps=constants.STREAM_FPS):
+        self.variants = variants
+        self.frame_interval_s = 1 / fps
+        self.cache = {} # (intersection, lane or None for the grid, variant) -> {'source', 'built_at', 'jpeg', 'lock'}
+        self.lock = threading.Lock()
+
+    def _entry(self, key):
+        with self.lock:
+            return self.cache.setdefault(key, {'source': None, 'built_at': 0.0, 'jpeg': None, 'lock': threading.Lock()})
+
+    def lane_jpeg(self, intersection, lane, variant):
+        """Latest frame of a lane as JPEG bytes in the given variant, or None if no frame yet."""
+        with intersection.lock:
+            frame = intersection.last_frames.get(lane)
+        if frame is None:
+            return None
+
+        entry = self._entry((intersection.name, lane, variant))
+        with entry['lock']: # Viewers of the same variant wait for one encode instead of repeating it
+            if entry['source'] is not frame: # last_frames[lane] is replaced, never modified, on each new frame
+                import cv2
+                spec = self.variants[variant]
+                if frame.shape[1] != spec['width']:
+                    height = frame.shape[0] * spec['width'] // frame.shape[1]
+                    frame_to_encode = cv2.resize(frame, (spec['width'], height), interpolation=cv2.INTER_AREA)
+                else:
+                    frame_to_encode = frame
+                flag, encoded = cv2.imencode(".jpg", frame_to_encode, [cv2.IMWRITE_JPEG_QUALITY, spec['quality']])
+                if flag:
+                    entry['source'], entry['jpeg'] = frame, encoded.tobytes()
+            return entry['jpeg']
+
+    def grid_jpeg(self, intersection):
+        """All lanes of an intersection composited into one labelled grid (2x2 for four lanes), as JPEG bytes."""
+        entry = self._entry((intersection.name, None, 'grid'))
+        with entry['lock']:
+            if time.time() - entry['built_at'] < self.frame_interval_s:
+                return entry['jpeg']
+            import cv2
+            with intersection.lock:
+                frames = [intersection.last_frames.get(lane) for lane in intersection.lanes]
+
+            columns = math.ceil(math.sqrt(len(frames)))
+            rows = math.ceil(len(frames) / columns)
+            cell_width = constants.GRID_CELL_WIDTH
+            cell_height = cell_width * 9 // 16
+            grid = np.zeros((rows * cell_height, columns * cell_width, 3), dtype=np.uint8)
+            for index, (lane, frame) in enumerate(zip(intersection.lanes, frames)):
+                y, x = (index // columns) * cell_height, (index % columns) * cell_width
+                if frame is not None:
+                    grid[y:y + cell_height, x:x + cell_width] = cv2.resize(frame, (cell_width, cell_height), interpolation=cv2.INTER_AREA)
+                cv2.putText(grid, lane.upper(), (x + 8, y + cell_height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+            flag, encoded = cv2.imencode(".jpg", grid, [cv2.IMWRITE_JPEG_QUALITY, constants.GRID_JPEG_QUALITY])
+            if flag:
+                entry['jpeg'] = encoded.tobytes()
+            entry['built_at'] = time.time()
+            return entry['jpeg']
+
+    def mjpeg(self, get_jpeg, stop_event):
+        """
+        Generator of multipart MJPEG chunks for Flask. `get_jpeg()` returns the latest
+        JPEG bytes; a frame is only sent when it has changed, to save bandwidth.
+        """
+        last_sent = None
+        while not stop_event.is_set():
+            jpeg = get_jpeg()
+            if jpeg is not None and jpeg is not last_sent:
+                yield b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+                last_sent = jpeg
+            time.sleep(self.frame_interval_s)
@@ -0,0 +1,103 @@
+# d:\Smart Ambulance Traffic\core\tiling.py
+
+import time
+import cv2
+import numpy as np
+import constants
+
+def make_tiles(frame, roi=constants.TILING_ROI, tile_size=constants.TILE_SIZE, overlap=constants.TILE_OVERLAP):
+    """
+    Cuts the far-field region of a raw frame into overlapping square tiles at full resolution.
+
+    Args:
+        frame (np.ndarray): Raw camera frame.
+        roi (tuple): (x1, y1, x2, y2) of the region, as fractions of the frame size.
+        tile_size (int): Tile side in raw pixels (reduced if the region is smaller).
+        overlap (float): Fraction of a tile shared with its neighbour, so that vehicles on
+            a tile edge are seen whole in at least one tile.
+
+    Returns a list of (tile, (x offset, y offset)). All tiles have the same size, so
+    they can go through the model as one batch.
+    """
+    height, width = frame.shape[:2]
+    x1, y1 = int(roi[0] * width), int(roi[1] * height)
+    x2, y2 = int(roi[2] * width), int(roi[3] * height)
+    size = min(tile_size, x2 - x1, y2 - y1)
+    if size <= 0:
+        return []
+    stride = max(1, int(size * (1 - overlap)))
+
+    def starts(low, high):
+        positions = list(range(low, high - size + 1, stride))
+        if positions[-1] + size < high:
+            positions.append(high - size) # Last tile is shifted back to stay inside the region
+        return positions
+
+    return [(frame[y:y + size, x:x + size], (x, y)) for y in starts(y1, y2) for x in starts(x1, x2)]
+
+def merge_tile_detections(results, offsets, names, iou_threshold=constants.TILE_NMS_IOU):
+    """
+    Maps per-tile YOLO results back to frame pixels and removes the duplicates from
+    overlapping tiles with per-class non-maximum suppression.
+    Returns a list of (label, confidence, [x1, y1, x2, y2]).
+    """
+    by_label = {}
+    for result, (offset_x, offset_y) in zip(results, offsets):
+        for box in result.boxes:
+            x1, y1, x2, y2 = [float(v) for v in box.xyxy[0]]
+            by_label.setdefault(names[int(box.cls[0])], []).append(
+                (float(box.conf[0]), [x1 + offset_x, y1 + offset_y, x2 + offset_x, y2 + offset_y]))
+
+    merged = []
+    for label, detections in by_label.items():
+        scores = [score for score, _ in detections]
+        xywh = [[x1, y1, x2 - x1, y2 - y1] for _, (x1, y1, x2, y2) in detections]
+        keep = cv2.dnn.NMSBoxes(xywh, scores, 0.0, iou_threshold)
+        for index in np.array(keep).flatten():
+            merged.append((label, detections[index][0], detections[index][1]))
+    return merged
+
+def is_inconclusive(detections, frame_shape, roi=constants.TILING_ROI):
+    """
+    True if a full-frame pass (no emergency vehicle confirmed) still leaves doubt about
+    the far field: a low-confidence or very small detection, or a rejected emergency
+    candidate, inside the region. `detections` is a list of (label, confidence, box in
+    raw-frame pixels).
+    """
+    height, width = frame_shape[:2]
+    for label, confidence, (x1, y1, x2, y2) in detections:
+        centre_x, centre_y = (x1 + x2) / 2 / width, (y1 + y2) / 2 / height
+        if not (roi[0] <= centre_x <= roi[2] and roi[1] <= centre_y <= roi[3]):
+            continue
+        if (label in constants.EMERGENCY_CANDIDATE_CLASSES or confidence < constants.TILING_UNCERTAIN_CONFIDENCE
+                or y2 - y1 < constants.TILING_SMALL_OBJECT_PX):
+            return True
+    return False
+
+class TilingScheduler:
+    """
+    Per-lane decision of when the expensive tiled pass is worth running.
+
+    It runs when the cheap full-frame pass is inconclusive, keeps running while the
+    previous tiled pass found a possible emergency vehicle (to follow it down the
+    approach), and otherwise runs only every TILING_REFRESH_S, since a distant
+    ambulance may not show up in the full frame at all. It never runs more often
+    than every TILING_MIN_INTERVAL_S.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.last_run = None
+        self.following = False # The last tiled pass found a possible emergency vehicle
+
+    def should_tile(self, inconclusive):
+        now = self.clock()
+        if self.last_run is None:
+            return True
+        if now - self.last_run < constants.TILING_MIN_INTERVAL_S:
+            return False
+        return inconclusive or self.following or now - self.last_run >= constants.TILING_REFRESH_S
+
+    def record(self, found_candidate):
+        """Call after each tiled pass."""
+        self.last_run = self.clock()
+        self.following = found_candidate
@@ -1,16 +1,48 @@
 # d:\Smart Ambulance Traffic\core\traffic_system.py
 
 import time
-import cv2 # Import OpenCV for drawing
 import collections
-from Alerts.telegram_alert import send_alert
+from phase_plan import PhasePlan
+from queue_estimator import QueueEstimator, webster_green_times
+from runtime_config import RuntimeConfig
+from fusion import EvidenceFusion
 import constants
 
 class TrafficSystem:
     """
     Encapsulates the entire state and logic for the smart traffic light system.
     """
-    def __init__(self):
+    def __init__(self, lanes=None, phase_plan=None, green_time_policy=constants.GREEN_TIME_POLICY,
+                 clock=time.time, alert_sender=None, event_sink=None, config=None):
+        """
+        Args:
+            lanes (list, optional): Camera lane names of this junction. Defaults to constants.LANES.
+            phase_plan (PhasePlan, optional): The junction's signal phases. Defaults to
+                PhasePlan.default(lanes), the 4-way North-South / East-West split.
+            green_time_policy (str): 'webster' for adaptive green times from the queue
+                estimates, or 'fixed' to give every phase the old fixed green
+                (GREEN_LIGHT_DURATION_DENSITY, within its min/max green).
+            clock (callable): Returns the current time in seconds. Simulations pass their own.
+            alert_sender (callable, optional): Called with each alert message. Defaults to the
+                Telegram sender, imported only then, since it needs the local config.py.
+            event_sink (callable, optional): Called as event_sink(kind, subject=..., value=...,
+                text=..., ts_ms=...) for every detection, phase change, siren, alert and
+                pre-emption, e.g. EventStore.append. Must be cheap; it runs on the hot path.
+            config (RuntimeConfig, optional): Live-tunable settings (light durations,
+                density and emergency thresholds). Defaults to the values in constants.py.
+        """
+        self.clock = clock
+        if alert_sender is None:
+            from Alerts.telegram_alert import send_alert
+            alert_sender = send_alert
+        self.alert_sender = alert_sender
+        self.event_sink = event_sink
+        self.config = config or RuntimeConfig()
+        self.settings = self.config.current() # Snapshot used for a whole tick; refreshed at the start of each
+        self.phase_plan = phase_plan or PhasePlan.default(list(lanes or constants.LANES))
+        # Every signal group gets a light, including ones without a camera (e.g. crosswalks).
+        self.lanes = list(dict.fromkeys(list(lanes or constants.LANES) + self.phase_plan.lanes))
+
         # --- Color Mapping for Drawing ---
         self.color_map = {
             'RED': (0, 0, 255),
@@ -20,22 +52,37 @@ class TrafficSystem:
 
         # --- Core State ---
         # self.light_state = "RED" # OLD: Single state
-        self.light_states = {lane: 'RED' for lane in constants.LANES}
-        self.siren_heard = False # Siren is global (heard everywhere)
-        self.density_per_lane = {lane: 0 for lane in constants.LANES}
-        self.high_density_in_lane = {lane: False for lane in constants.LANES}
-        self.ambulance_in_lane = {lane: False for lane in constants.LANES}
+        self.light_states = {lane: 'RED' for lane in self.lanes}
+        self.density_per_lane = {lane: 0 for lane in self.lanes}
+        self.high_density_in_lane = {lane: False for lane in self.lanes}
+        self.ambulance_in_lane = {lane: False for lane in self.lanes} # Fused verdict, refreshed from self.fusion
+        # Time-decayed camera and siren evidence, combined into a per-lane pre-emption score.
+        self.fusion = EvidenceFusion(self.lanes, clock=clock, config=self.config)
         self.manual_override = False
 
-        # --- NEW: State for 4-way intersection ---
-        self.active_phase = 'NS' # Can be 'NS' (North-South) or 'EW' (East-West)
-        self.phase_map = {'NS': ['north', 'south'], 'EW': ['east', 'west']}
+        # --- Queue Estimation ---
+        # Smoothed queues and arrival/discharge rates; these drive phase choice and green length.
+        self.queue_estimator = QueueEstimator(self.lanes)
+        self.green_time_policy = green_time_policy
+        self.green_target_ms = 0 # Green length chosen for the active phase when it turned green
+
+        # --- Corridor Pre-emption ---
+        # lane -> (start_ms, end_ms) window during which an ambulance announced by an
+        # upstream intersection is expected, so the lane is served as if one were seen.
+        self.preemption_windows = {}
+
+        # --- Phase Plan State ---
+        self.phase_map = self.phase_plan.phase_map()
+        self.active_phase = next(iter(self.phase_map)) # The phase being served (or last served)
+        self.next_phase = None # Chosen by the RED handler, applied by tick()
+        self.phase_calls = set() # Pedestrian push-button calls waiting to be served
+        self.siren_preemption_recorded = False # The current siren already got its 'preemption' event (and clip)
 
         # --- Timers and Counters ---
         self.yellow_light_timer = 0
         self.green_light_timer = 0
         self.low_density_timer = 0 # NEW: Timer for the green light grace period
-        self.right_turn_red_timer = 0 # NEW: Timer for the right turn early red
+        self.red_since = {lane: self._get_time_ms() for lane in self.lanes} # For per-lane wait time
         self.ambulance_disappeared_frames = 0
 
         # --- Alerting ---
@@ -50,14 +97,97 @@ class TrafficSystem:
             'YELLOW': self._handle_state_yellow, # Logic for when the main light is YELLOW
         }
 
-    def update_detection_results(self, lane, vehicle_count, ambulance_detected):
-        """Updates the system's state based on the latest video frame analysis."""
+    def update_detection_results(self, lane, vehicle_count, emergency_confidence):
+        """
+        Updates the system's state based on the latest video frame analysis.
+        `emergency_confidence` is the detector's emergency-vehicle confidence in [0, 1]
+        (a bool also works: True counts as certain).
+        """
         self.density_per_lane[lane] = vehicle_count
-        self.ambulance_in_lane[lane] = ambulance_detected
-        self.high_density_in_lane[lane] = vehicle_count >= constants.HIGH_DENSITY_THRESHOLD
+        self.high_density_in_lane[lane] = vehicle_count >= self.config.current()['HIGH_DENSITY_THRESHOLD']
+        self.queue_estimator.update(lane, vehicle_count, self._get_time_ms(), self.light_states[lane] == 'GREEN')
+        self.fusion.add_visual(lane, float(emergency_confidence))
+        self._refresh_emergencies()
+        self._record('detection', lane, value=vehicle_count)
+
+    def report_siren(self):
+        """Called when the microphone confirms a siren."""
+        self.fusion.add_confirmed_siren()
+        self._record('siren', value=1.0)
+
+    def report_siren_level(self, level):
+        """Called for each analysed audio block with its siren evidence level in [0, 1]."""
+        self.fusion.add_audio(level)
+
+    def _siren_heard(self):
+        """
+        True while a confirmed siren is being heard. The evidence decays, so this expires on its
+        own once the siren stops. Per-block levels only feed the per-lane score, never this.
+        """
+        return self.fusion.siren_level() >= constants.FUSION_SIREN_LEVEL
+
+    def _refresh_emergencies(self):
+        """
+        Re-evaluates the fused pre-emption verdict of every lane (the evidence decays over
+        time) and records an 'ambulance' event, with the fused score, when a lane trips.
+        """
+        for lane in self.lanes:
+            was_emergency = self.ambulance_in_lane[lane]
+            self.ambulance_in_lane[lane] = self.fusion.is_emergency(lane)
+            if self.ambulance_in_lane[lane] and not was_emergency:
+                self._record('ambulance', lane, value=self.fusion.score(lane))
+
+    def _record(self, kind, subject='', value=0.0, text=''):
+        """Passes one event to the event sink, if there is one."""
+        if self.event_sink is not None:
+            self.event_sink(kind, subject=subject, value=value, text=text, ts_ms=self._get_time_ms())
  
+    def request_preemption(self, lane, arrival_in_ms):
+        """
+        Announces an ambulance expected to reach `lane` in `arrival_in_ms` milliseconds.
+        The lane's phase is served early enough to discharge the queue ahead of it.
+        """
+        if lane not in self.light_states:
+            return
+        now = self._get_time_ms()
+        # Start clearing early: a fixed lead plus time to discharge the vehicles already queued.
+        lead_ms = constants.CORRIDOR_MIN_LEAD_MS + self.density_per_lane[lane] * constants.CORRIDOR_DISCHARGE_HEADWAY_MS
+        start_ms = now + arrival_in_ms - lead_ms
+        end_ms = now + arrival_in_ms + constants.CORRIDOR_PREEMPTION_HOLD_MS
+        self.preemption_windows[lane] = (start_ms, end_ms)
+        self._record('announcement', lane, value=arrival_in_ms)
+        self.event_messages.append(f"🚑 Ambulance expected in {lane.upper()} lane in {arrival_in_ms / 1000:.0f}s. Clearing ahead.")
+
+    def call_phase(self, phase_name):
+        """
+        Registers a pedestrian push-button (or other external) call for a phase.
+        Returns False if the phase doesn't exist.
+        """
+        if phase_name not in self.phase_map:
+            return False
+        self.phase_calls.add(phase_name)
+        self.event_messages.append(f"🚶 Call registered for {phase_name} phase.")
+        return True
+
+    def _emergency_in_lane(self, lane):
+        """True if an ambulance is seen in the lane or an announced one is due now."""
+        if self.ambulance_in_lane.get(lane):
+            return True
+        window = self.preemption_windows.get(lane)
+        if window is None:
+            return False
+        now = self._get_time_ms()
+        if now > window[1]:
+            del self.preemption_windows[lane] # The announced ambulance has passed
+            return False
+        return now >= window[0]
+
     def tick(self):
         """Executes one cycle of the state machine logic."""
+        self.settings = self.config.current() # Settings changed at runtime take effect from this tick
+        self._refresh_emergencies()
+        if not self._siren_heard():
+            self.siren_preemption_recorded = False # The siren has faded; the next one is a fresh event
         # --- THE DEFINITIVE FIX ---
         # If the system is in manual override, the state machine must not run at all.
         # All state changes are handled exclusively by the 'manual_override' endpoint.
@@ -72,26 +202,70 @@ class TrafficSystem:
 
         # If the state changes, update all lights in the current phase.
         if main_light_current_state == 'RED' and main_light_next_state == 'GREEN':
+            # Switch to the phase the RED handler picked, then turn it green.
+            self.active_phase = self.next_phase
             self._start_green_light_cycle()
             for lane in self.phase_map[self.active_phase]:
                 self.light_states[lane] = 'GREEN'
+            self.phase_calls.discard(self.active_phase)
+            self._record('phase', self.active_phase, value=self.green_target_ms, text='GREEN')
 
         elif main_light_current_state == 'GREEN' and main_light_next_state == 'YELLOW':
             self.yellow_light_timer = self._get_time_ms()
             self.low_density_timer = 0
-            self.right_turn_red_timer = 0
             for lane in self.phase_map[self.active_phase]:
                 self.light_states[lane] = 'YELLOW'
+            self._record('phase', self.active_phase, text='YELLOW')
 
         elif main_light_current_state == 'YELLOW' and main_light_next_state == 'RED':
-            # The phase is over, switch to the other phase and set all its lights to RED.
-            for lane in self.phase_map[self.active_phase]:
-                self.light_states[lane] = 'RED'
-            self.active_phase = 'EW' if self.active_phase == 'NS' else 'NS'
+            # The phase is over: all-red until the RED handler picks the next phase.
+            now = self._get_time_ms()
+            for lane in self.lanes:
+                if self.light_states[lane] != 'RED':
+                    self.light_states[lane] = 'RED'
+                    self.red_since[lane] = now
+            self._record('phase', self.active_phase, text='RED')
+
+    def _phase_demands(self):
+        """
+        Demand of every phase: smoothed queue length times how long it has waited, summed
+        over its lanes. Pedestrian phases count a fixed demand per pending call instead.
+        """
+        now = self._get_time_ms()
+        demands = {}
+        for name, phase in self.phase_plan.phases.items():
+            if phase.pedestrian:
+                wait_s = (now - min(self.red_since[lane] for lane in phase.lanes)) / 1000
+                demands[name] = self.settings['PEDESTRIAN_CALL_DEMAND'] * wait_s if name in self.phase_calls else 0
+                continue
+            demands[name] = sum(
+                self.queue_estimator.queue[lane] * (now - self.red_since[lane]) / 1000
+                for lane in phase.lanes if self.light_states[lane] == 'RED'
+            )
+        return demands
+
+    def _emergency_phase(self, exclude=None):
+        """Returns the first phase (in plan order) with an ambulance seen or due, or None."""
+        for name, lanes in self.phase_map.items():
+            if name != exclude and any(self._emergency_in_lane(lane) for lane in lanes):
+                return name
+        return None
+
+    def _compute_green_target(self, phase_name):
+        """
+        Green length for a phase that is about to turn green: its share of the Webster
+        cycle, stretched to discharge the queue already waiting, within its min/max green.
+        """
+        phase = self.phase_plan.phases[phase_name]
+        if self.green_time_policy == 'fixed':
+            return min(max(constants.GREEN_LIGHT_DURATION_DENSITY, phase.min_green_ms), phase.max_green_ms)
+        webster_ms = webster_green_times(self.phase_plan, self.queue_estimator, self.settings['YELLOW_LIGHT_DURATION'])[phase_name]
+        target_ms = max(webster_ms, self.queue_estimator.clearance_time_ms(phase.lanes))
+        return min(max(target_ms, phase.min_green_ms), phase.max_green_ms)
 
     def _get_time_ms(self):
         """Returns the current time in milliseconds."""
-        return time.time() * 1000
+        return self.clock() * 1000
 
     def set_auto_mode(self):
         """Resets the system to automatic control, initiating a safe transition."""
@@ -105,82 +279,118 @@ class TrafficSystem:
         # Reset all stateful flags to ensure a clean start for the auto-cycle.
         self.alert_sent = False
         self.density_alert_sent = False
-        self.siren_heard = False
 
     # --- State Handler Methods ---
 
     def _start_green_light_cycle(self):
         """Helper to handle logic when turning a light green."""
         self.green_light_timer = self._get_time_ms()
-        if self.siren_heard and not self.alert_sent:
+        self.green_target_ms = self._compute_green_target(self.active_phase)
+        if self._siren_heard() and not self.alert_sent:
             msg = "🚨 SIREN DETECTED! Turning signal GREEN."
             self.event_messages.append(msg)
-            send_alert(msg)
+            self.alert_sender(msg)
+            self._record('alert', self.active_phase, text=msg)
             self.alert_sent = True
         elif any(self.high_density_in_lane[lane] for lane in self.phase_map[self.active_phase]) and not self.density_alert_sent:
             msg = f"🚗 High traffic in {self.active_phase} phase! Turning signal GREEN."
             self.event_messages.append(msg)
-            send_alert(msg)
+            self.alert_sender(msg)
+            self._record('alert', self.active_phase, text=msg)
             self.density_alert_sent = True
 
     def _handle_state_red(self):
-        """Determines the next state from RED. Returns 'GREEN' or 'RED'."""
-        # Check for events in the *inactive* phase to decide if we should switch.
-        inactive_phase = 'EW' if self.active_phase == 'NS' else 'NS'
-        
-        # An ambulance in an inactive red-light lane is the highest priority event.
-        ambulance_waiting = any(self.ambulance_in_lane[lane] for lane in self.phase_map[inactive_phase])
-        if ambulance_waiting:
-            return 'GREEN' # This will trigger a phase change in tick()
-
-        # Check for high density in the inactive phase.
-        density_waiting = any(self.high_density_in_lane[lane] for lane in self.phase_map[inactive_phase])
-        event_detected = self.siren_heard or density_waiting
-        if event_detected:
+        """
+        Determines the next state from RED (all-red). Returns 'GREEN' or 'RED'.
+        On 'GREEN', self.next_phase holds the phase to serve.
+        """
+        # An ambulance (seen or announced) is the highest priority event. With ambulances on
+        # several phases, serve one other than the phase just served, so they take turns.
+        emergency_phase = self._emergency_phase(exclude=self.active_phase) or self._emergency_phase()
+        if emergency_phase is not None:
+            self.next_phase = emergency_phase
+            self._record('preemption', emergency_phase, text='served from all-red')
+            return 'GREEN'
+
+        # Otherwise serve the phase with the most demand (queue length x wait time).
+        demand_phase = self.phase_plan.choose_next_phase(self._phase_demands(), self.active_phase)
+        if demand_phase is not None:
+            self.next_phase = demand_phase
+            return 'GREEN'
+
+        # A siren without any visible demand still gets the junction moving.
+        if self._siren_heard():
+            # Vehicle phases only: a pedestrian phase is only served when it has been called.
+            vehicle_phases = {name: 1 for name, phase in self.phase_plan.phases.items() if not phase.pedestrian}
+            self.next_phase = self.phase_plan.choose_next_phase(vehicle_phases, self.active_phase)
+            # Recorded once per siren: every 'preemption' exports a clip (CLIP_TRIGGER_KINDS).
+            if not self.siren_preemption_recorded:
+                self._record('preemption', self.next_phase, text='siren')
+                self.siren_preemption_recorded = True
             return 'GREEN'
         return 'RED'
 
     def _handle_state_green(self):
         """Determines the next state from GREEN. Returns 'YELLOW' or 'GREEN'."""
-        # Priority 1: An ambulance in an opposing lane forces a switch.
-        inactive_phase = 'EW' if self.active_phase == 'NS' else 'NS'
-        ambulance_waiting = any(self.ambulance_in_lane[lane] for lane in self.phase_map[inactive_phase])
-        if ambulance_waiting:
-            self.event_messages.append(f"🚑 Ambulance detected in {inactive_phase} phase! Switching lights.")
-            return 'YELLOW'
+        phase = self.phase_plan.phases[self.active_phase]
+        green_elapsed = self._get_time_ms() - self.green_light_timer
+
+        # Priority 1: Hold the green while an ambulance is in, or due on, the active phase.
+        # It goes before a switch, so ambulances on two conflicting phases are served in turn.
+        if any(self._emergency_in_lane(lane) for lane in phase.lanes):
+            return 'GREEN'
 
-        # Priority 1.5: If the green light has been on for its max duration, switch.
-        # This prevents a phase from staying green forever if density remains high.
-        if self._get_time_ms() - self.green_light_timer > constants.GREEN_LIGHT_DURATION_DENSITY:
-            self.event_messages.append(f"🚦 Max green time for {self.active_phase} reached. Switching.")
+        # Priority 1.2: An ambulance in another phase forces a switch.
+        emergency_phase = self._emergency_phase(exclude=self.active_phase)
+        if emergency_phase is not None:
+            self.event_messages.append(f"🚑 Ambulance detected in {emergency_phase} phase! Switching lights.")
+            self._record('preemption', emergency_phase, text=f"cut short {self.active_phase}")
             return 'YELLOW'
 
-        # Priority 2: High-Density Logic
-        if self.density_alert_sent:
-            # Stay green as long as there is density in the current phase.
-            if any(self.high_density_in_lane[lane] for lane in self.phase_map[self.active_phase]):
-                self.low_density_timer = 0 # Reset grace period while density is high
-                self.right_turn_red_timer = 0 # Also reset the right turn timer
-                return 'GREEN'
-            
-            # Density has dropped, start the grace period timer.
-            if self.low_density_timer == 0:
-                self.low_density_timer = self._get_time_ms()
-            
-            # If grace period has passed, it's time to turn yellow.
-            if self._get_time_ms() - self.low_density_timer > constants.GREEN_LIGHT_GRACE_PERIOD:
-                self.event_messages.append("🚦 Traffic has cleared. Returning to RED.")
+        # Priority 1.3: Every phase runs for at least its minimum green.
+        if green_elapsed < phase.min_green_ms:
+            return 'GREEN'
+
+        demands = self._phase_demands()
+        others_waiting = any(demand > 0 for name, demand in demands.items() if name != self.active_phase)
+        queue_cleared = self.queue_estimator.phase_queue(phase.lanes) < constants.QUEUE_CLEARED_VEHICLES
+
+        if others_waiting:
+            # Priority 1.5: If the green light has been on for its max duration, switch.
+            # This prevents a phase from starving the others.
+            if green_elapsed > phase.max_green_ms:
+                self.event_messages.append(f"🚦 Max green time for {self.active_phase} reached. Switching.")
                 return 'YELLOW'
-            
-            return 'GREEN' # Stay green during the grace period
 
-        # Fallback: If the state is GREEN but no event (siren or density) is active,
-        # transition to YELLOW to safely return to RED.
-        return 'YELLOW'
+            # Priority 2: Adaptive timing. Gap out once the queue has been discharged,
+            # otherwise run for the green length computed when the phase started.
+            if queue_cleared and self.green_time_policy != 'fixed':
+                self.event_messages.append(f"🚦 Queue in {self.active_phase} cleared. Switching.")
+                return 'YELLOW'
+            if green_elapsed >= self.green_target_ms:
+                self.event_messages.append(f"🚦 Green time for {self.active_phase} used ({self.green_target_ms / 1000:.0f}s). Switching.")
+                return 'YELLOW'
+            return 'GREEN'
+
+        # Nobody else is waiting: keep serving this phase while it still has a queue.
+        if not queue_cleared:
+            self.low_density_timer = 0 # Reset grace period while there is traffic
+            return 'GREEN'
+
+        # Density has dropped, start the grace period timer.
+        if self.low_density_timer == 0:
+            self.low_density_timer = self._get_time_ms()
+
+        # If grace period has passed, it's time to turn yellow.
+        if self._get_time_ms() - self.low_density_timer > self.settings['GREEN_LIGHT_GRACE_PERIOD']:
+            self.event_messages.append("🚦 Traffic has cleared. Returning to RED.")
+            return 'YELLOW'
+
+        return 'GREEN' # Stay green during the grace period
 
     def _handle_state_yellow(self):
         """Determines the next state from YELLOW. Returns 'RED' or 'YELLOW'."""
-        if self._get_time_ms() - self.yellow_light_timer > constants.YELLOW_LIGHT_DURATION:
+        if self._get_time_ms() - self.yellow_light_timer > self.settings['YELLOW_LIGHT_DURATION']:
             return 'RED'
         return 'YELLOW'
 
@@ -190,6 +400,7 @@ class TrafficSystem:
         """
         if frame is None:
             return None
+        import cv2 # Only needed for drawing; keeps the controller importable without OpenCV
 
         # Position for the light indicator on the top-right of the frame
         # (frame_width - margin, margin_from_top)
@@ -3,17 +3,32 @@
 import cv2
 import threading
 import time
-from ultralytics import YOLO
+from detection_engine import DetectionEngine
+from emergency_classifier import EmergencyVehicleClassifier, LightBarTracker
+from tiling import TilingScheduler, is_inconclusive, make_tiles, merge_tile_detections
+from runtime_config import RuntimeConfig
 import constants
 
 class VisionProcessor:
     """
     Handles video capture, frame resizing, and object detection.
     """
-    def __init__(self, video_source=0, lane_name="default"):
-        self.model = YOLO(constants.YOLO_MODEL_PATH)
+    def __init__(self, video_source=0, lane_name="default", resize_width=None, detection_engine=None,
+                 emergency_classifier=None, far_field_roi=constants.TILING_ROI, config=None):
+        # Lanes normally share one engine; a private one is created if none is given.
+        self.owns_engine = detection_engine is None
+        self.detection_engine = detection_engine or DetectionEngine()
+        # Second stage for bus/truck candidates. The light-bar tracker is per lane.
+        self.emergency_classifier = emergency_classifier or EmergencyVehicleClassifier()
+        self.light_bar_tracker = LightBarTracker()
+        # Live-tunable thresholds, read once per detection pass.
+        self.config = config or RuntimeConfig()
+        # Optional tiled pass over the far end of the approach, for distant ambulances (TILING_ENABLED).
+        self.far_field_roi = far_field_roi
+        self.tiling_scheduler = TilingScheduler()
         self.video_source = video_source
         self.lane_name = lane_name
+        self.resize_width = resize_width or constants.RESIZE_WIDTH
 
         # --- FIX: Conditionally apply backend based on source type ---
         if isinstance(self.video_source, int):
@@ -29,7 +44,7 @@ class VisionProcessor:
         self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         aspect_ratio = self.frame_height / self.frame_width
-        self.new_height = int(constants.RESIZE_WIDTH * aspect_ratio)
+        self.new_height = int(self.resize_width * aspect_ratio)
 
         # --- Threading for Lag-Free Video ---
         self.latest_frame = None
@@ -72,29 +87,136 @@ class VisionProcessor:
     def process_frame(self):
         """
         Reads a frame, performs detection, and returns results.
-        Returns a tuple: (annotated_frame, vehicle_count, ambulance_detected)
+        Returns a tuple: (annotated_frame, vehicle_count, emergency_confidence)
         """
         success, frame = self.read()
         if not success:
-            return None, 0, False
+            return None, 0, 0.0
 
-        resized_frame = cv2.resize(frame, (constants.RESIZE_WIDTH, self.new_height))
-        results = self.model(resized_frame, verbose=False)
-        
-        # By default, plot() draws boxes, confidence scores, and labels.
-        # This is more explicit and ensures you see the detections.
-        annotated_frame = results[0].plot()
+        return self.detect([frame])[0]
+
+    def detect(self, frames):
+        """
+        Runs detection on a list of raw frames in a single forward pass.
+        Returns a list of (annotated_frame, vehicle_count, emergency_confidence) tuples,
+        where emergency_confidence in [0, 1] is the strongest emergency-vehicle evidence
+        in the frame (0.0 if there is none). TrafficSystem fuses it with the siren level.
+        """
+        settings = self.config.current()
+        resized_frames = [cv2.resize(frame, (self.resize_width, self.new_height)) for frame in frames]
+        results = self.detection_engine.detect(resized_frames)
+
+        scale = [frame.shape[1] / self.resize_width for frame in frames] # Resized -> raw frame pixels
+        detections = []
+        candidates = [] # (frame index, box in raw-frame pixels, crop)
+        last_frame_boxes = [] # (label, confidence, box in raw-frame pixels) of the newest frame, for the tiling scheduler
+        for frame_index, result in enumerate(results):
+            # By default, plot() draws boxes, confidence scores, and labels.
+            # This is more explicit and ensures you see the detections.
+            annotated_frame = result.plot()
+
+            vehicle_count = 0
+            emergency_confidence = 0.0
+            for box in result.boxes:
+                label = self.detection_engine.names[int(box.cls[0])]
+                raw_box = [float(v) * scale[frame_index] for v in box.xyxy[0]]
+                if frame_index == len(frames) - 1:
+                    last_frame_boxes.append((label, float(box.conf[0]), raw_box))
+                if label in constants.VEHICLE_CLASSES: vehicle_count += 1
+                if label in constants.EMERGENCY_VEHICLE_CLASSES:
+                    emergency_confidence = max(emergency_confidence, float(box.conf[0]))
+                if label in constants.EMERGENCY_CANDIDATE_CLASSES:
+                    x1, y1, x2, y2 = [int(v) for v in raw_box]
+                    crop = frames[frame_index][max(0, y1):y2, max(0, x1):x2]
+                    if crop.size:
+                        candidates.append((frame_index, raw_box, crop))
+            detections.append([annotated_frame, vehicle_count, emergency_confidence])
+
+        # --- Second stage: verify bus/truck candidates, all crops in one batch ---
+        if candidates:
+            if settings['EMERGENCY_CLASSIFIER_ENABLED']:
+                self.light_bar_tracker.update_boxes([box for i, box, _ in candidates if i == len(frames) - 1])
+                self.light_bar_tracker.sample(frames[-1])
+                scores = self.emergency_classifier.score([crop for _, _, crop in candidates])
+            else:
+                scores = [1.0] * len(candidates)
+            for (frame_index, box, _), score in zip(candidates, scores):
+                if settings['EMERGENCY_CLASSIFIER_ENABLED'] and self.light_bar_tracker.is_flashing(box):
+                    # A flashing light bar lowers the bar from the normal to the flash threshold.
+                    score = min(1.0, score + settings['EMERGENCY_SCORE_THRESHOLD'] - settings['EMERGENCY_FLASH_SCORE_THRESHOLD'])
+                elif settings['EMERGENCY_CLASSIFIER_ENABLED']:
+                    score = self._cap_heuristic_score(score, settings)
+                # Weak candidates still count as evidence; only confident ones are drawn.
+                detections[frame_index][2] = max(detections[frame_index][2], score)
+                if score >= settings['EMERGENCY_SCORE_THRESHOLD']:
+                    self._draw_emergency(detections[frame_index][0], box, scale[frame_index], f"EMERGENCY {score:.2f}")
+
+        # --- Tiled far-field pass, only when the full frame leaves doubt ---
+        if settings['TILING_ENABLED'] and detections[-1][2] < settings['EMERGENCY_SCORE_THRESHOLD']:
+            inconclusive = is_inconclusive(last_frame_boxes, frames[-1].shape, self.far_field_roi)
+            if self.tiling_scheduler.should_tile(inconclusive):
+                self._detect_far_field(frames[-1], detections[-1], scale[-1], settings)
+
+        return [tuple(detection) for detection in detections]
+
+    def _detect_far_field(self, frame, detection, scale, settings):
+        """
+        Runs overlapping full-resolution tiles of the far-field region through the model
+        as one batch, merges them with NMS and verifies candidates like the full-frame pass.
+        Updates `detection` ([annotated_frame, vehicle_count, emergency_confidence]) in place.
+        """
+        tiles = make_tiles(frame, self.far_field_roi)
+        if not tiles:
+            return
+        results = self.detection_engine.detect([tile for tile, _ in tiles])
+        merged = merge_tile_detections(results, [offset for _, offset in tiles], self.detection_engine.names)
+
+        emergencies = [(box, confidence) for label, confidence, box in merged if label in constants.EMERGENCY_VEHICLE_CLASSES]
+        candidates = [box for label, _, box in merged if label in constants.EMERGENCY_CANDIDATE_CLASSES]
+        self.tiling_scheduler.record(found_candidate=bool(emergencies or candidates))
+
+        crops = [frame[max(0, int(y1)):int(y2), max(0, int(x1)):int(x2)] for x1, y1, x2, y2 in candidates]
+        kept = [(box, crop) for box, crop in zip(candidates, crops) if crop.size]
+        if kept:
+            if settings['EMERGENCY_CLASSIFIER_ENABLED']:
+                scores = [self._cap_heuristic_score(score, settings) for score in self.emergency_classifier.score([crop for _, crop in kept])]
+            else:
+                scores = [1.0] * len(kept)
+            emergencies += [(box, score) for (box, _), score in zip(kept, scores)]
+
+        for box, score in emergencies:
+            detection[2] = max(detection[2], score)
+            if score >= settings['EMERGENCY_SCORE_THRESHOLD']:
+                self._draw_emergency(detection[0], box, scale, f"FAR EMERGENCY {score:.2f}")
 
-        vehicle_count = 0
-        ambulance_detected = False
-        for box in results[0].boxes:
-            label = self.model.names[int(box.cls[0])]
-            if label in constants.VEHICLE_CLASSES: vehicle_count += 1
-            if label in constants.EMERGENCY_VEHICLE_CLASSES: ambulance_detected = True
+    def _cap_heuristic_score(self, score, settings):
+        """
+        Without a classifier model, the colour heuristic also matches red or blue paint
+        (a red cab, a blue trailer), so on its own it only reaches the flash threshold:
+        weak evidence, never a pre-emption. A flashing light bar lifts it to the full threshold.
+        """
+        if self.emergency_classifier.has_model:
+            return score
+        return min(score, settings['EMERGENCY_FLASH_SCORE_THRESHOLD'])
+
+    @staticmethod
+    def _draw_emergency(annotated_frame, box, scale, text):
+        """Marks a confirmed emergency vehicle (box in raw-frame pixels) on the resized, annotated frame."""
+        x1, y1, x2, y2 = [int(v / scale) for v in box]
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
+        cv2.putText(annotated_frame, text, (x1, max(15, y1 - 25)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
 
-        return annotated_frame, vehicle_count, ambulance_detected
+    def sample_light_bars(self, frame):
+        """
+        Cheap per-frame check of the candidates' light bars, for frames that skip detection.
+        Lets the flash pattern be seen even though YOLO only runs on every Nth frame.
+        """
+        if self.config.current()['EMERGENCY_CLASSIFIER_ENABLED']:
+            self.light_bar_tracker.sample(frame)
 
     def stop(self):
         """Signals the reader thread to stop."""
         self.running = False
-        self.thread.join()
\ No newline at end of file
+        self.thread.join()
+        if self.owns_engine:
+            self.detection_engine.stop()
\ No newline at end of file
@@ -1,10 +1,8 @@
 # d:\Smart Ambulance Traffic\web_app.py
 
 import argparse
-import cv2
 import threading
 import time # CRITICAL FIX: This was missing, causing the app to crash.
-from flask import Flask, render_template, Response, request, jsonify
 import sys
 import os
 
@@ -13,21 +11,38 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
-from audio import audio_listener_thread
-from vision import VisionProcessor
-from traffic_system import TrafficSystem
+from startup import StartupReport, preload_modules # First, so startup timings begin here
+
+# OpenCV, ultralytics, scipy and sounddevice are heavy to import. They are imported
+# inside the functions that need them, and preloaded in the background at startup.
+from flask import Flask, render_template, Response, request, jsonify, abort
+from detection_engine import DetectionEngine
+from intersection import Intersection, load_intersections, DEFAULT_INTERSECTION
+from corridor import CorridorCoordinator, LoopbackBus, load_corridor_links
+from event_store import EventStore
+from clip_recorder import ClipRecorder
+from streams import StreamHub
+from runtime_config import RuntimeConfig
 import constants
 
 # ===================================================================
 # SHARED STATE & APPLICATION SETUP
 # ===================================================================
 app = Flask(__name__)
-state_lock = threading.Lock() # To safely update state from multiple threads
 
-# --- Global Instance of the Traffic System ---
-traffic_system = TrafficSystem()
-last_frames = {} # NEW: Dictionary to hold the latest frame from each camera
+# --- Hosted Intersections ---
+# name -> Intersection. Each one holds its own TrafficSystem, last frames and lock.
+# In single-junction mode this holds just DEFAULT_INTERSECTION.
+intersections = {}
+detection_engine = None # Shared by every camera of every intersection
+emergency_classifier = None # Second-stage bus/truck verifier, shared the same way
+corridor_coordinators = [] # Green-wave links between the hosted intersections
 stop_event = threading.Event() # NEW: Global event to signal threads to stop
+startup_report = StartupReport() # Import, model load and first-detection timings
+event_store = None # Compressed history of detections, phases, sirens, alerts and pre-emptions
+clip_recorder = None # Recent JPEG frames of every lane, exported as a clip around each pre-emption
+stream_hub = StreamHub() # Encodes each frame once per stream variant, shared by all viewers
+runtime_config = RuntimeConfig() # Settings that can be tuned live (see /config)
 
 def select_video_sources_cli():
     """A command-line fallback for selecting video files."""
@@ -93,16 +108,36 @@ def pre_flight_checks(video_sources):
     print("✅ All checks passed.")
     return True
 
+def make_event_sink(intersection_name):
+    """
+    Builds the TrafficSystem event sink for one intersection: every event goes to the
+    event store, and pre-emptions also export an incident clip. Runs inside tick(),
+    so both calls only queue work for their background threads.
+    """
+    def event_sink(kind, subject='', value=0.0, text='', ts_ms=None):
+        event_store.append(kind, intersection_name, subject, value, text, ts_ms)
+        if kind in constants.CLIP_TRIGGER_KINDS:
+            clip_recorder.trigger(intersection_name, f"{kind} {subject} {text}", ts_ms)
+    return event_sink
+
 def system_logic_thread():
     """
     A dedicated thread to run the main traffic system logic (the "tick").
     This decouples the core logic from any single video processing thread.
+    One thread ticks every hosted intersection.
     """
     print("⚙️ System logic thread started.")
     tick_interval = 0.1 # Run the logic 10 times per second
     while not stop_event.is_set():
-        with state_lock:
-            traffic_system.tick()
+        for intersection in intersections.values():
+            with intersection.lock:
+                intersection.traffic_system.tick()
+                has_green = 'GREEN' in intersection.traffic_system.light_states.values()
+            if has_green:
+                startup_report.mark(f"first green: {intersection.name}")
+        # Coordinators take the intersection locks themselves, as announcements cross junctions.
+        for coordinator in corridor_coordinators:
+            coordinator.tick()
         time.sleep(tick_interval)
     print("System logic thread stopped.")
 
@@ -110,24 +145,47 @@ def system_logic_thread():
 # ===================================================================
 # BACKGROUND PROCESSING THREAD
 # ===================================================================
-def video_processing_thread(lane, video_source):
+def lane_is_ready(intersection, lane):
+    """A lane is ready once its camera is open and the warmed-up model has processed a frame."""
+    return startup_report.has(f"first detection: {intersection.name}/{lane}")
+
+def _report_lane_ready(intersection, lane):
+    """Records a lane's first detection; prints the startup timings once every lane is ready."""
+    startup_report.mark(f"first detection: {intersection.name}/{lane}")
+    if all(lane_is_ready(i, l) for i in intersections.values() for l in i.lanes):
+        startup_report.mark("all lanes ready")
+        if detection_engine is not None:
+            for step, seconds in detection_engine.timings.items():
+                startup_report.record_duration(step, seconds)
+        startup_report.print_summary()
+
+def video_processing_thread(intersection, lane, video_source):
     """The main background thread for video capture, detection, and state updates."""
-    global last_frames, stop_event
+    import cv2
+    from vision import VisionProcessor
+    last_frames = intersection.last_frames
+    state_lock = intersection.lock
+    traffic_system = intersection.traffic_system
     try:
-        vision_processor = VisionProcessor(video_source=video_source, lane_name=lane)
+        vision_processor = VisionProcessor(video_source=video_source, lane_name=lane,
+                                           detection_engine=detection_engine,
+                                           emergency_classifier=emergency_classifier,
+                                           config=runtime_config)
     except IOError as e:
         print(f"---!!! ERROR !!!--- Could not start video processing: {e}")
         return
+    startup_report.mark(f"camera opened: {intersection.name}/{lane}")
 
     video_fps = vision_processor.cap.get(cv2.CAP_PROP_FPS)
     if not video_fps or video_fps <= 0:
         video_fps = 30 # Fallback for webcams
     
     frame_duration = 1 / video_fps
-    frame_count = 0
+    frames_since_detection = 0
 
     while not stop_event.is_set():
         start_time = time.time()
+        settings = runtime_config.current() # Settings changed at runtime take effect from this frame
 
         # --- THE HOLISTIC FIX: A consistent order of operations on every frame ---
 
@@ -146,19 +204,26 @@ def video_processing_thread(lane, video_source):
                     cv2.putText(lost_signal_frame, "SIGNAL LOST", (50, lost_signal_frame.shape[0] // 2), 
                                 cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
                     last_frames[lane] = lost_signal_frame
-            stop_event.set() # Stop this thread
-            print(f"---! WARNING !--- Signal lost for lane '{lane}'. Thread will stop.")
-            continue
+            # Stop this lane only: the other cameras and every junction's lights keep running.
+            print(f"---! WARNING !--- Signal lost for lane '{lane}' of '{intersection.name}'. Thread will stop.")
+            break
 
         # 2. On Nth frames, perform expensive detection and update the system's knowledge.
-        if frame_count % constants.PROCESS_EVERY_NTH_FRAME == 0:
-            annotated_frame, vehicle_count, ambulance_detected = vision_processor.process_frame()
+        # Detection runs more often while the fused emergency evidence for this lane is building.
+        with state_lock:
+            detection_interval = traffic_system.fusion.detection_interval(lane, settings['PROCESS_EVERY_NTH_FRAME'])
+        if frames_since_detection == 0 or frames_since_detection >= detection_interval:
+            frames_since_detection = 0
+            annotated_frame, vehicle_count, emergency_confidence = vision_processor.process_frame()
             with state_lock:
                 # Update the system with what this lane sees
-                traffic_system.update_detection_results(lane, vehicle_count, ambulance_detected)
+                traffic_system.update_detection_results(lane, vehicle_count, emergency_confidence)
+            if not startup_report.has(f"first detection: {intersection.name}/{lane}"):
+                _report_lane_ready(intersection, lane)
         else:
             # If not processing, just resize the raw frame for display
             annotated_frame = cv2.resize(frame, (constants.RESIZE_WIDTH, vision_processor.new_height))
+            vision_processor.sample_light_bars(frame) # Catch the light bar between detections
 
         # 3. Draw the current light state for THIS lane onto the frame and store it.
         # This is now done on every frame to ensure the display is always up-to-date.
@@ -167,57 +232,80 @@ def video_processing_thread(lane, video_source):
             if display_frame is not None:
                 last_frames[lane] = display_frame.copy()
 
-        frame_count += 1
+        # 4. Keep a few seconds of encoded footage for incident clips (rate-limited, outside the lock).
+        if display_frame is not None and clip_recorder.wants_frame(intersection.name, lane, start_time):
+            flag, encoded = cv2.imencode(".jpg", display_frame, [cv2.IMWRITE_JPEG_QUALITY, constants.CLIP_JPEG_QUALITY])
+            if flag:
+                clip_recorder.add_frame(intersection.name, lane, start_time, encoded)
+
+        frames_since_detection += 1
         # Synchronize to the video's original FPS
         elapsed_time = time.time() - start_time
         sleep_time = max(0, frame_duration - elapsed_time)
         time.sleep(sleep_time)
     
     vision_processor.stop()
-    print(f"Video processing thread for lane '{lane}' stopped.")
+    print(f"Video processing thread for lane '{lane}' of '{intersection.name}' stopped.")
 
 # ===================================================================
 # FLASK ROUTES
 # ===================================================================
+def get_intersection(name):
+    """Looks up a hosted intersection, aborting with 404 if it doesn't exist."""
+    if name not in intersections:
+        abort(404, f"Unknown intersection '{name}'")
+    return intersections[name]
+
 @app.route('/')
-def index():
+@app.route('/i/<intersection_name>/')
+def index(intersection_name=None):
     """Serves the main HTML page."""
-    return render_template('index.html')
-
-def generate_frames_for_lane(lane):
-    """Generator function that yields JPEG-encoded video frames."""
-    while not stop_event.is_set():
-        frame_to_send = None
-        with state_lock:
-            # Get the latest frame for the requested lane
-            if lane in last_frames and last_frames[lane] is not None:
-                frame_to_send = last_frames[lane].copy()
-        
-        if frame_to_send is not None:
-            (flag, encodedImage) = cv2.imencode(".jpg", frame_to_send)
-            if flag:
-                yield(b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + 
-                      bytearray(encodedImage) + b'\r\n')
-        
-        # A small sleep prevents this loop from spinning too fast if a frame isn't ready
-        # or if the client disconnects.
-        time.sleep(0.07) # Target ~15 FPS for the web feed to save encoding CPU
+    if intersection_name is None:
+        # Bare '/': the default junction, or the first one in multi-junction mode without a 'main'.
+        intersection_name = DEFAULT_INTERSECTION if DEFAULT_INTERSECTION in intersections else next(iter(intersections), DEFAULT_INTERSECTION)
+    intersection = get_intersection(intersection_name)
+    return render_template('index.html', intersection=intersection.name, lanes=intersection.lanes,
+                           signal_groups=intersection.traffic_system.lanes)
+
+@app.route('/intersections')
+def list_intersections():
+    """Lists the hosted intersections and their lanes."""
+    return jsonify({name: intersection.lanes for name, intersection in intersections.items()})
 
 @app.route('/video_feed/<lane>')
-def video_feed(lane):
-    """A unique video feed endpoint for each lane."""
-    if lane not in constants.LANES:
+@app.route('/i/<intersection_name>/video_feed/<lane>')
+def video_feed(lane, intersection_name=DEFAULT_INTERSECTION):
+    """
+    A unique video feed endpoint for each lane. ?variant= picks the resolution and
+    quality (see constants.STREAM_VARIANTS), e.g. 'thumb' for small previews.
+    """
+    intersection = get_intersection(intersection_name)
+    if lane not in intersection.lanes:
         return "Invalid lane specified", 404
-    return Response(generate_frames_for_lane(lane), mimetype='multipart/x-mixed-replace; boundary=frame')
+    variant = request.args.get('variant', constants.DEFAULT_STREAM_VARIANT)
+    if variant not in constants.STREAM_VARIANTS:
+        return f"Invalid variant, choose one of: {', '.join(constants.STREAM_VARIANTS)}", 404
+    frames = stream_hub.mjpeg(lambda: stream_hub.lane_jpeg(intersection, lane, variant), stop_event)
+    return Response(frames, mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/grid_feed')
+@app.route('/i/<intersection_name>/grid_feed')
+def grid_feed(intersection_name=DEFAULT_INTERSECTION):
+    """One low-resolution stream with every lane of the intersection in a grid, for overview pages."""
+    intersection = get_intersection(intersection_name)
+    frames = stream_hub.mjpeg(lambda: stream_hub.grid_jpeg(intersection), stop_event)
+    return Response(frames, mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/events')
-def events():
+@app.route('/i/<intersection_name>/events')
+def events(intersection_name=DEFAULT_INTERSECTION):
     """Server-Sent Events endpoint for real-time status messages."""
+    intersection = get_intersection(intersection_name)
     def generate_events():
         while not stop_event.is_set():
-            with state_lock:
+            with intersection.lock:
                 try:
-                    msg = traffic_system.event_messages.popleft()
+                    msg = intersection.traffic_system.event_messages.popleft()
                     yield f"data: {msg}\n\n"
                 except IndexError:
                     pass # Queue is empty, do nothing
@@ -225,28 +313,96 @@ def events():
     return Response(generate_events(), mimetype='text/event-stream')
 
 @app.route('/status')
-def status():
+@app.route('/i/<intersection_name>/status')
+def status(intersection_name=DEFAULT_INTERSECTION):
     """Provides the current state of the traffic system as JSON."""
-    with state_lock:
+    intersection = get_intersection(intersection_name)
+    traffic_system = intersection.traffic_system
+    with intersection.lock:
         # Create a dictionary with the states of all lights and other info
         system_status = {
-            'lights': traffic_system.light_states,
-            'density_per_lane': traffic_system.density_per_lane,
-            'manual_mode': traffic_system.manual_override
+            'lights': dict(traffic_system.light_states),
+            'density_per_lane': dict(traffic_system.density_per_lane),
+            'manual_mode': traffic_system.manual_override,
+            'emergency_score_per_lane': {lane: round(traffic_system.fusion.score(lane), 3) for lane in traffic_system.lanes},
         }
+    system_status['lanes_ready'] = {lane: lane_is_ready(intersection, lane) for lane in intersection.lanes}
     return jsonify(system_status)
 
+@app.route('/startup')
+def startup_timings():
+    """Startup milestones (seconds since process start) and step durations."""
+    report = startup_report.as_dict()
+    if detection_engine is not None:
+        report['durations_s'].update(detection_engine.timings)
+        report['detector_ready'] = detection_engine.ready.is_set()
+    return jsonify(report)
+
+@app.route('/history')
+def history():
+    """
+    Past events as JSON. Query parameters (all optional): start and end (unix
+    seconds; default the last hour), kind (repeatable), intersection and subject.
+    """
+    if event_store is None:
+        abort(503)
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 3600))
+    except ValueError:
+        abort(400)
+    events = event_store.query(start * 1000, end * 1000, kinds=request.args.getlist('kind'),
+                               intersection=request.args.get('intersection'), subject=request.args.get('subject'))
+    return jsonify(events)
+
+@app.route('/config', methods=['GET', 'POST'])
+def config():
+    """
+    GET: the live-tunable settings and their version. POST: a JSON object of settings
+    to change; it is validated as a whole and applied from the next frame or tick.
+    """
+    if request.method == 'POST':
+        try:
+            runtime_config.update(request.get_json(silent=True), source='api')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(runtime_config.values())
+
+@app.route('/call_phase', methods=['POST'])
+@app.route('/i/<intersection_name>/call_phase', methods=['POST'])
+def call_phase(intersection_name=DEFAULT_INTERSECTION):
+    """Push-button input: registers a call for a phase, e.g. {"phase": "PED"} for a crosswalk."""
+    intersection = get_intersection(intersection_name)
+    phase = (request.get_json(silent=True) or {}).get('phase')
+    with intersection.lock:
+        called = intersection.traffic_system.call_phase(phase)
+    if not called:
+        return jsonify({'error': f"Unknown phase '{phase}'"}), 404
+    return {"status": "ok"}
+
 @app.route('/manual_override', methods=['POST'])
-def manual_override():
+@app.route('/i/<intersection_name>/manual_override', methods=['POST'])
+def manual_override(intersection_name=DEFAULT_INTERSECTION):
     """Endpoint to handle manual control of the traffic lights from the UI."""
+    intersection = get_intersection(intersection_name)
+    traffic_system = intersection.traffic_system
     data = request.get_json()
     action = data.get('action')
     
-    with state_lock:
+    with intersection.lock:
         if action == 'set_lane':
             lane = data.get('lane')
             state = data.get('state')
-            if lane in traffic_system.light_states and state in ['RED', 'YELLOW', 'GREEN']:
+            if lane not in traffic_system.light_states or state not in ['RED', 'YELLOW', 'GREEN']:
+                return {"status": "ok"} # Unknown lane or state: ignored
+            conflicting_green = [
+                other for other, other_state in traffic_system.light_states.items()
+                if other != lane and other_state != 'RED' and traffic_system.phase_plan.conflicts_with(lane, other)
+            ]
+            if state == 'GREEN' and conflicting_green:
+                # Never show green against a conflicting movement, even in manual mode.
+                traffic_system.event_messages.append(f"⛔ Manual: {lane.upper()} conflicts with {', '.join(conflicting_green).upper()}. Set them RED first.")
+            else:
                 traffic_system.manual_override = True
                 traffic_system.light_states[lane] = state
                 traffic_system.event_messages.append(f"🕹️ Manual: Set {lane.upper()} to {state}")
@@ -260,41 +416,101 @@ def manual_override():
 # MAIN EXECUTION
 # ===================================================================
 if __name__ == '__main__':
-    # --- Step 1: Get video sources from the user using native file dialogs ---
-    user_selected_videos = select_video_sources()
-    
-    if not user_selected_videos:
-        sys.exit(1) # Exit if user cancelled selection
+    parser = argparse.ArgumentParser(description="Smart ambulance-aware traffic control server.")
+    parser.add_argument('--config', help="JSON file describing several intersections to host in this process "
+                                         "(see intersections.example.json). Without it, one junction is set up interactively.")
+    args = parser.parse_args()
+
+    # Start importing the heavy libraries now, so they load while videos are being
+    # selected and checked instead of afterwards.
+    preload_modules(['cv2', 'ultralytics'], startup_report)
+
+    if args.config:
+        # --- Step 1 (multi-junction): Load every intersection from the config file ---
+        try:
+            intersections.update(load_intersections(args.config, runtime_config))
+            corridor_links = load_corridor_links(args.config, intersections)
+        except (OSError, ValueError) as e:
+            print(f"❌ ERROR: Could not load intersection config '{args.config}': {e}")
+            sys.exit(1)
+
+        # Link the hosted intersections into a green-wave corridor, if one is configured.
+        if corridor_links:
+            corridor_bus = LoopbackBus()
+            for intersection in intersections.values():
+                corridor_coordinators.append(CorridorCoordinator(
+                    intersection.name, intersection.traffic_system, corridor_bus, corridor_links, lock=intersection.lock))
+    else:
+        # --- Step 1: Get video sources from the user using native file dialogs ---
+        user_selected_videos = select_video_sources()
+
+        if not user_selected_videos:
+            sys.exit(1) # Exit if user cancelled selection
+        intersections[DEFAULT_INTERSECTION] = Intersection(DEFAULT_INTERSECTION, user_selected_videos, microphone=True, config=runtime_config)
+
+    # Record every intersection's detections, phase changes and alerts for /history,
+    # and save the footage around every pre-emption.
+    event_store = EventStore()
+    clip_recorder = ClipRecorder()
+    for intersection in intersections.values():
+        intersection.traffic_system.event_sink = make_event_sink(intersection.name)
 
     # --- Step 2: Run Pre-flight Checks on selected files ---
-    if not pre_flight_checks(user_selected_videos):
-        sys.exit(1) # Stop if checks fail
+    for intersection in intersections.values():
+        if not pre_flight_checks(intersection.video_sources):
+            sys.exit(1) # Stop if checks fail
 
+    processing_threads = []
     try:
         # --- Step 3: Start Background Threads ---
         print("Starting background threads...")
+
+        # 0. One detection engine (one model copy) shared by every camera. It loads and
+        #    warms up the model on its own thread, while the cameras open below.
+        detection_engine = DetectionEngine(warmup_shape=(constants.RESIZE_WIDTH * 9 // 16, constants.RESIZE_WIDTH))
+        from emergency_classifier import EmergencyVehicleClassifier
+        emergency_classifier = EmergencyVehicleClassifier()
         
-        # 1. Video Processing Threads (one for each camera)
-        processing_threads = []
-        # Use the video files selected by the user
-        for lane, source in user_selected_videos.items():
-            thread = threading.Thread(target=video_processing_thread, args=(lane, source))
-            thread.start()
-            processing_threads.append(thread)
+        # 1. Video Processing Threads (one for each camera of each intersection)
+        for intersection in intersections.values():
+            for lane, source in intersection.video_sources.items():
+                thread = threading.Thread(target=video_processing_thread, args=(intersection, lane, source))
+                thread.start()
+                processing_threads.append(thread)
         
+        # 1.5 Runtime config file watcher (applies edits to RUNTIME_CONFIG_PATH without a restart)
+        config_thread = threading.Thread(target=runtime_config.watch_file, args=(constants.RUNTIME_CONFIG_PATH, stop_event), daemon=True)
+        config_thread.start()
+
         # 2. System Logic Thread (the new "heartbeat")
         logic_thread = threading.Thread(target=system_logic_thread)
         logic_thread.start()
 
-        # 2. Audio Listener Thread
+        # 2. Audio Listener Thread (the microphone belongs to the junctions flagged for it)
+        siren_intersections = [i for i in intersections.values() if i.microphone]
         def on_siren_detected():
-            with state_lock:
-                traffic_system.siren_heard = True
+            for intersection in siren_intersections:
+                with intersection.lock:
+                    intersection.traffic_system.report_siren()
+        def on_siren_level(level):
+            for intersection in siren_intersections:
+                with intersection.lock:
+                    intersection.traffic_system.report_siren_level(level)
+        def audio_evidence_is_weak():
+            for intersection in siren_intersections:
+                with intersection.lock:
+                    if not intersection.traffic_system.fusion.evidence_is_weak():
+                        return False
+            return True
         
-        audio_thread = threading.Thread(target=audio_listener_thread, args=(on_siren_detected, stop_event))
-        audio_thread.start()
+        if siren_intersections:
+            from audio import audio_listener_thread
+            audio_thread = threading.Thread(target=audio_listener_thread, args=(on_siren_detected, stop_event, runtime_config,
+                                                                                 on_siren_level, audio_evidence_is_weak))
+            audio_thread.start()
 
         # --- Step 4: Run Flask App ---
+        print(f"Hosting {len(intersections)} intersection(s): {', '.join(intersections)}")
         print("Flask server starting... Open http://127.0.0.1:5000 in your browser.")
         print("Press CTRL+C to stop the server.")
         app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -309,4 +525,7 @@ if __name__ == '__main__':
             thread.join()
         if 'logic_thread' in locals(): logic_thread.join()
         if 'audio_thread' in locals(): audio_thread.join()
-        print("All threads stopped. Exiting.")
+        if detection_engine is not None: detection_engine.stop()
+        if event_store is not None: event_store.stop()
+        if clip_recorder is not None: clip_recorder.stop()
+        print("All threads stopped. Exiting.")
\ No newline at end of file